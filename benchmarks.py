@@ -0,0 +1,766 @@
+"""قياسات أداء المحاكاة
+
+الاستخدام:
+    python benchmarks.py collisions
+    python benchmarks.py starts
+    python benchmarks.py draw
+    python benchmarks.py preview
+    python benchmarks.py latency [--replay session.fwr] [--budget-ms 200] [--inference-ms 50]
+    python benchmarks.py gestures [--replay session.fwr] [--noise 0.004]
+    python benchmarks.py features
+    python benchmarks.py inference --video clip.mp4 [--frames 600]
+    python benchmarks.py startup [--camera URL]
+    python benchmarks.py world [--map facility.json] [--map-out facility.json]
+    python benchmarks.py riders
+"""
+import argparse
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# الرسم على سطح في الذاكرة دون فتح نافذة
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+import project_final as pf
+
+# ==============================
+# الاصطدام: الشبكة المكانية مقابل الفحص الخطي
+# ==============================
+def linear_collides(obstacles, x, y, width, height, direction):
+    """الطريقة القديمة: فحص كل العقبات واحدة تلو الأخرى"""
+    for obstacle in obstacles:
+        if pf.box_overlaps_rect(x, y, width / 2, height / 2, direction,
+                                obstacle.x, obstacle.y,
+                                obstacle.x + obstacle.width, obstacle.y + obstacle.height):
+            return True
+    return False
+
+def random_obstacles(count, rng):
+    """عقبات عشوائية بكثافة ثابتة، فالخريطة تكبر مع عددها"""
+    side = int(math.sqrt(count) * 200)
+    kinds = ["wall", "cone", "plant"]
+    obstacles = []
+    for _ in range(count):
+        kind = rng.choice(kinds)
+        if kind == "wall":
+            width, height = rng.choice([(150, 25), (25, 150)])
+        else:
+            width = height = rng.randint(30, 60)
+        obstacles.append(pf.Obstacle(rng.uniform(0, side), rng.uniform(0, side), width, height, kind))
+    return obstacles, side
+
+def bench_collisions(counts=(10, 100, 1000, 10000), queries=5000, seed=0):
+    rng = random.Random(seed)
+    print(f"{'obstacles':>10} {'linear us/query':>16} {'vector us/query':>16} "
+          f"{'grid us/query':>14} {'speedup':>8}")
+    for count in counts:
+        obstacles, side = random_obstacles(count, rng)
+        grid = pf.ObstacleGrid(obstacles)
+        array = grid.obstacles
+        chairs = [(rng.uniform(0, side), rng.uniform(0, side), rng.uniform(0, 360))
+                  for _ in range(queries)]
+        
+        start = time.perf_counter()
+        linear = [linear_collides(obstacles, x, y, 120, 160, d) for x, y, d in chairs]
+        linear_time = time.perf_counter() - start
+        
+        # كل العقبات دفعة واحدة بعمليات NumPy، بدون الشبكة
+        start = time.perf_counter()
+        vectorized = [array.collides(x, y, 120, 160, d) for x, y, d in chairs]
+        vector_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        gridded = [grid.collides(x, y, 120, 160, d) for x, y, d in chairs]
+        grid_time = time.perf_counter() - start
+        
+        if not linear == vectorized == gridded:
+            raise SystemExit(f"grid, vectorized and linear scans disagree for {count} obstacles")
+        print(f"{count:>10} {linear_time / queries * 1e6:>16.1f} {vector_time / queries * 1e6:>16.1f} "
+              f"{grid_time / queries * 1e6:>14.1f} {linear_time / grid_time:>7.1f}x")
+
+# أحجام شاشات شائعة؛ العالم الافتراضي بحجم الشاشة فمواقع العقبات والبداية تختلف معها
+SCREEN_SIZES = ((1280, 720), (1366, 768), (1440, 900), (1536, 864), (1600, 900),
+                (1920, 1080), (2560, 1440), (3840, 2160))
+
+def riders_start_clear(width, height, count):
+    """عدد الكراسي التي تبدأ خالية من العقبات والكراسي الأخرى وتتحرك بالسكربت التجريبي"""
+    sim = pf.Simulation(width, height, riders=count)
+    clear = [not sim.collider.for_chair(i).collides(c.x, c.y, c.width, c.height, c.direction)
+             for i, c in enumerate(sim.wheelchairs)]
+    for faces, key_mask in pf.scripted_inputs(pf.DEMO_SCRIPT):
+        sim.step(np.repeat(faces, count, axis=0), key_mask)
+    return sum(ok and rider.distance_traveled > 0 for ok, rider in zip(clear, sim.riders))
+
+def bench_starts(sizes=SCREEN_SIZES, riders=(4, 6, 8)):
+    """يفشل (رمز خروج 1) إذا بدأ كرسي على عقبة أو على كرسي آخر أو لم يتحرك بالسكربت التجريبي"""
+    print(f"{'screen':>10} {'start':>14} {'distance':>9} {'collisions':>11} "
+          + " ".join(f"{f'{count} riders':>10}" for count in riders))
+    stuck = []
+    for width, height in sizes:
+        sim = pf.Simulation(width, height)
+        start = sim.wheelchair.x, sim.wheelchair.y
+        blocked = sim.obstacle_grid.collides(*start, sim.wheelchair.width, sim.wheelchair.height,
+                                             sim.wheelchair.direction)
+        result = pf.run_headless(pf.scripted_inputs(pf.DEMO_SCRIPT), width, height,
+                                 stop_on_complete=False)
+        if blocked or result["distance_traveled"] == 0:
+            stuck.append(f"{width}x{height}")
+        # عدة ركاب: كل كرسي يبدأ خالياً ويتحرك بنفس السكربت
+        placed = []
+        for count in riders:
+            moved = riders_start_clear(width, height, count)
+            placed.append(f"{moved}/{count} ok")
+            if moved < count:
+                stuck.append(f"{width}x{height} with {count} riders")
+        print(f"{width:>5}x{height:<4} {f'({start[0]:.0f}, {start[1]:.0f})':>14} "
+              f"{result['distance_traveled']:>9.0f} {result['collisions']:>11} "
+              + " ".join(f"{text:>10}" for text in placed))
+    if stuck:
+        raise SystemExit(f"wheelchair starts blocked on: {', '.join(stuck)}")
+    print("the wheelchair starts clear and moves on every screen size")
+
+# ==============================
+# رسم الكرسي: الذاكرة المؤقتة مقابل إعادة الرسم كل إطار
+# ==============================
+def legacy_draw(wheelchair, screen):
+    """المسار القديم: سطح جديد وتدوير ونقاط أثر جديدة في كل إطار"""
+    trail = wheelchair.trail_points().tolist()
+    for i, (x, y) in enumerate(trail):
+        alpha = int(100 * (i / len(trail)))
+        size = int(8 * (i / len(trail)))
+        s = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
+        pygame.draw.circle(s, (70, 130, 180, alpha), (size, size), size)
+        screen.blit(s, (int(x)-size, int(y)-size))
+    chair_surface = pf.render_chair_surface(wheelchair.width, wheelchair.height,
+                                            wheelchair.color, wheelchair.wheel_rotation)
+    rotated_chair = pygame.transform.rotate(chair_surface, wheelchair.direction)
+    screen.blit(rotated_chair, rotated_chair.get_rect(center=(wheelchair.x, wheelchair.y)))
+
+def bench_draw(frames=3000):
+    pygame.init()
+    pf.small_font = pygame.font.Font(None, 18)
+    screen = pygame.Surface((1920, 1080))
+    wheelchair = pf.Wheelchair(960, 540, bounds=(1920, 1080))
+    for i in range(wheelchair.max_trail_length + 5):
+        wheelchair.x = 700 + i * pf.TRAIL_SPACING
+        wheelchair._add_trail_point()
+    wheelchair.x = 960
+    
+    def run(draw):
+        start = time.perf_counter()
+        wheelchair.direction = 0
+        wheelchair.wheel_rotation = 0
+        for frame in range(frames):
+            # كما في المحاكاة: الكرسي إما يدور في مكانه أو يتحرك باتجاه ثابت
+            if (frame // 90) % 2 == 0:
+                wheelchair.direction = (wheelchair.direction + 3) % 360
+            else:
+                wheelchair.wheel_rotation += 10
+            draw(wheelchair, screen)
+        return (time.perf_counter() - start) / frames * 1000
+    
+    legacy_ms = run(legacy_draw)
+    cold = pf.SpriteCache()
+    pf.CHAIR_SPRITES = cold
+    cached_ms = run(lambda w, s: w.draw(s))
+    warm_ms = run(lambda w, s: w.draw(s))
+    print(f"legacy draw:        {legacy_ms:.3f} ms/frame")
+    print(f"sprite cache cold:  {cached_ms:.3f} ms/frame")
+    print(f"sprite cache warm:  {warm_ms:.3f} ms/frame "
+          f"({legacy_ms / warm_ms:.1f}x, {len(cold.entries)} sprites, "
+          f"{cold.bytes_used / 1e6:.1f} MB, hit rate "
+          f"{cold.hits / max(1, cold.hits + cold.misses):.0%})")
+
+# ==============================
+# معاينة الكاميرا: النسخ والحجوزات لكل إطار
+# ==============================
+def legacy_preview(raw_frame, shm_buffer):
+    """المسار القديم: قلب، تحويلان إلى RGB، سطح جديد ثم تصغير إلى سطح جديد"""
+    frame = cv2.flip(raw_frame, 1)
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=shm_buffer)
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frame_surface = pygame.surfarray.make_surface(frame_rgb.swapaxes(0, 1))
+    return pygame.transform.scale(frame_surface, (280, 210))
+
+class WriteCounter:
+    """عد البايتات التي تكتبها دوال النسخ والتحويل فعلاً أثناء الكتلة
+    
+    تُغلف دوال cv2 وnumpy وpygame المستخدمة في مسار المعاينة مؤقتاً وتُجمع أحجام
+    المصفوفات والأسطح التي تكتبها (الناتجة أو dst)؛ النسخ إلى الشاشة يُضاف بـ add_surface
+    """
+    ARRAY_FUNCTIONS = ((cv2, "flip"), (cv2, "cvtColor"), (cv2, "resize"), (np, "copyto"))
+    SURFACE_FUNCTIONS = ((pygame.surfarray, "make_surface"), (pygame.transform, "scale"))
+    
+    def __init__(self):
+        self.bytes = 0
+        self.calls = 0
+        self.originals = []
+        
+    def add_surface(self, surface, bytesize=None):
+        self.bytes += surface.get_width() * surface.get_height() * (bytesize or surface.get_bytesize())
+        self.calls += 1
+        
+    def _wrap(self, module, name, measure):
+        original = getattr(module, name)
+        
+        def counted(*args, **kwargs):
+            result = original(*args, **kwargs)
+            measure(args, kwargs, result)
+            return result
+        self.originals.append((module, name, original))
+        setattr(module, name, counted)
+        
+    def _array_written(self, args, kwargs, result):
+        # np.copyto لا تُرجع شيئاً وتكتب في وسيطها الأول
+        target = args[0] if result is None else result
+        self.bytes += target.nbytes
+        self.calls += 1
+        
+    def __enter__(self):
+        for module, name in self.ARRAY_FUNCTIONS:
+            self._wrap(module, name, self._array_written)
+        for module, name in self.SURFACE_FUNCTIONS:
+            self._wrap(module, name, lambda args, kwargs, result: self.add_surface(result))
+        return self
+        
+    def __exit__(self, *exc):
+        for module, name, original in reversed(self.originals):
+            setattr(module, name, original)
+        self.originals = []
+
+def new_preview(preview, raw_frame, shm_buffer):
+    np.copyto(shm_buffer, preview.prepare(raw_frame))
+    preview.update()
+    return preview.surface
+
+def bench_preview(frames=500):
+    pygame.init()
+    screen = pygame.Surface((1920, 1080))
+    rng = np.random.default_rng(0)
+    raw_frames = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(8)]
+    shm_buffer = np.empty((480, 640, 3), dtype=np.uint8)
+    preview = pf.CameraPreview()
+    
+    allocated_surfaces = {"legacy": 2, "new": 0}
+    
+    def run(name, step):
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        allocations = 0
+        for i in range(frames):
+            snapshot = tracemalloc.get_traced_memory()[0]
+            surface = step(raw_frames[i % len(raw_frames)])
+            screen.blit(surface, (15, 15))
+            allocations += max(0, tracemalloc.get_traced_memory()[1] - snapshot)
+            tracemalloc.reset_peak()
+        elapsed = (time.perf_counter() - start) / frames * 1000
+        tracemalloc.stop()
+        # البايتات المكتوبة تُعد في تمريرة منفصلة حتى لا تدخل تكلفة العد في الزمن
+        with WriteCounter() as counter:
+            for i in range(len(raw_frames)):
+                surface = step(raw_frames[i])
+                screen.blit(surface, (15, 15))
+                counter.add_surface(surface, screen.get_bytesize())
+        written = counter.bytes / len(raw_frames)
+        print(f"{name:>7}: {elapsed:.3f} ms/frame, "
+              f"{allocations / frames / 1024:.0f} KiB numpy allocations/frame, "
+              f"{allocated_surfaces[name]} new surfaces/frame, "
+              f"{written / 1024:.0f} KiB written/frame in {counter.calls / len(raw_frames):.0f} calls")
+    
+    run("legacy", lambda f: legacy_preview(f, shm_buffer))
+    run("new", lambda f: new_preview(preview, f, shm_buffer))
+
+# ==============================
+# زمن الاستجابة من الإطار إلى الحركة (بإعادة تشغيل تسجيل)
+# ==============================
+def record_demo_session(path):
+    """تسجيل السكربت التجريبي لاستخدامه عند عدم تمرير تسجيل حقيقي"""
+    with pf.SessionRecorder(path) as recorder:
+        for i, (faces, key_mask) in enumerate(pf.scripted_inputs(pf.DEMO_SCRIPT)):
+            recorder.append(i / 60, key_mask, faces)
+
+def bench_latency(replay_path=None, budget_ms=200.0, inference_ms=0.0):
+    """يفشل (رمز خروج 1) إذا تجاوز p95 لأي إيماءة الحد المسموح
+    
+    الزمن من التقاط أول إطار ظهرت فيه الإيماءة إلى تطبيقها، فيشمل التنعيم ومدة البقاء
+    (GESTURE_DWELL حتى 150 ms)
+    """
+    if replay_path is None:
+        replay_path = os.path.join(tempfile.mkdtemp(), "demo.fwr")
+        record_demo_session(replay_path)
+    replay = pf.SessionReplay(replay_path)
+    sim = pf.Simulation(pf.WIDTH, pf.HEIGHT, riders=replay.max_faces)
+    for faces, key_mask, frame_dt, slots in replay:
+        # يُختم الإطار لحظة أخذه من التسجيل كما تختم الكاميرا إطاراتها
+        acquired = time.perf_counter()
+        if inference_ms:
+            # زمن استدلال Mediapipe المقاس على الجهاز (التسجيل يحتوي المعالم جاهزة)
+            time.sleep(inference_ms / 1000)
+        sim.step(faces, key_mask, acquired, frame_dt, slots)
+    
+    print(sim.latency.report())
+    summary = sim.latency.summary()
+    over = {gesture: stats["p95"] for gesture, stats in summary.items() if stats["p95"] > budget_ms}
+    if over:
+        raise SystemExit(f"p95 latency over the {budget_ms:g} ms budget: {over}")
+    print(f"all gestures within the {budget_ms:g} ms p95 budget")
+
+# ==============================
+# تنعيم الإيماءات: الارتجاف والدقة مقابل التصنيف الخام
+# ==============================
+def noisy_demo_session(path, noise, seed=0):
+    """تسجيل السكربت التجريبي مع ضجيج على المعالم؛ يُرجع الإيماءة الصحيحة لكل إطار"""
+    rng = np.random.default_rng(seed)
+    labels = []
+    with pf.SessionRecorder(path) as recorder:
+        i = 0
+        for gesture, count in pf.DEMO_SCRIPT:
+            for _ in range(count):
+                faces = pf.synthetic_face(gesture)
+                faces = faces + rng.normal(0, noise, faces.shape).astype(np.float32)
+                recorder.append(i / 60, 0, faces)
+                labels.append(gesture)
+                i += 1
+    return labels
+
+def classify_session(replay, smoothing):
+    """تصنيف كل إطار في التسجيل؛ يُرجع الإيماءات وزمن المعالجة لكل إطار"""
+    gestures = []
+    gesture_filter = None if smoothing is None else pf.GestureFilter(smoothing)
+    start = time.perf_counter()
+    for faces, _, frame_dt, _ in replay:
+        if not len(faces):
+            gestures.append("neutral")
+            if gesture_filter is not None:
+                gesture_filter.reset()
+            continue
+        features = pf.extract_gesture_features(faces[0])
+        if gesture_filter is None:
+            gestures.append(pf.classify_gesture(features))
+        else:
+            gestures.append(gesture_filter.update(features, frame_dt))
+    return gestures, (time.perf_counter() - start) / max(len(gestures), 1)
+
+def bench_gestures(replay_path=None, noise=0.004):
+    """بدون تسجيل يُولد السكربت التجريبي مع ضجيج فتُقاس الدقة أيضاً"""
+    labels = None
+    if replay_path is None:
+        replay_path = os.path.join(tempfile.mkdtemp(), "noisy.fwr")
+        labels = noisy_demo_session(replay_path, noise)
+    replay = pf.SessionReplay(replay_path)
+    minutes = max(replay.timestamps[-1] - replay.timestamps[0], 1e-9) / 60 if len(replay) else 1
+    
+    # الدقة الثابتة تتجاهل أول ربع ثانية بعد كل تغيير فتفصل الخطأ عن تأخر الاعتماد
+    steady = None
+    if labels is not None:
+        since_change = np.zeros(len(labels), dtype=int)
+        for i in range(1, len(labels)):
+            since_change[i] = 0 if labels[i] != labels[i - 1] else since_change[i - 1] + 1
+        steady = since_change >= 15
+    
+    results = {mode: classify_session(replay, mode) for mode in (None, "ema", "median")}
+    raw = np.array(results[None][0])
+    print(f"{'mode':>7} {'switches/min':>13} {'agree raw %':>12} {'accuracy %':>11} "
+          f"{'steady %':>9} {'us/frame':>9}")
+    for mode, (gestures, per_frame) in results.items():
+        gestures = np.array(gestures)
+        switches = np.count_nonzero(gestures[1:] != gestures[:-1])
+        agree = np.mean(gestures == raw) * 100
+        accuracy = steady_accuracy = "-"
+        if labels is not None:
+            correct = gestures == np.array(labels)
+            accuracy = f"{correct.mean() * 100:.1f}"
+            steady_accuracy = f"{correct[steady].mean() * 100:.1f}"
+        print(f"{mode or 'raw':>7} {switches / minutes:>13.1f} {agree:>12.1f} "
+              f"{accuracy:>11} {steady_accuracy:>9} {per_frame * 1e6:>9.1f}")
+    replay.close()
+
+# ==============================
+# استخراج الخصائص: من رسالة FaceMesh إلى متجه الخصائص
+# ==============================
+def legacy_attribute_gestures(landmarks):
+    """المسار الأصلي: دوال الإيماءات تقرأ خصائص protobuf نقطة نقطة"""
+    mouth_width = abs(landmarks[291].x - landmarks[61].x)
+    mouth_height = abs(landmarks[14].y - landmarks[13].y)
+    smiling = mouth_height >= 0.01 and mouth_width / mouth_height > 1.6
+    left_diff = landmarks[159].y - np.mean([landmarks[i].y for i in [70, 63, 105]])
+    right_diff = landmarks[386].y - np.mean([landmarks[i].y for i in [300, 293, 334]])
+    raised = left_diff > 0.03 or right_diff > 0.03
+    left_ratio = (landmarks[468].x - landmarks[33].x) / (landmarks[133].x - landmarks[33].x)
+    right_ratio = (landmarks[473].x - landmarks[362].x) / (landmarks[263].x - landmarks[362].x)
+    avg_ratio = (left_ratio + right_ratio) / 2
+    mouth_open = landmarks[14].y - landmarks[13].y > 0.05
+    return smiling, raised, avg_ratio, mouth_open
+
+def legacy_array_features(face_landmarks):
+    """المسار السابق: قائمة Python لكل المعالم ثم الحساب بالفهرسة على المصفوفة كاملة"""
+    points = np.array([(p.x, p.y, p.z) for p in face_landmarks.landmark], dtype=np.float32)
+    x = points[..., 0]
+    y = points[..., 1]
+    mouth_width = np.abs(x[..., pf.MOUTH_CORNERS[1]] - x[..., pf.MOUTH_CORNERS[0]])
+    mouth_opening = y[..., pf.LOWER_LIP] - y[..., pf.UPPER_LIP]
+    mouth_height = np.abs(mouth_opening)
+    brow_diff = y[..., pf.EYE_TOPS] - y[..., pf.EYEBROWS].mean(axis=-1)
+    corners = x[..., pf.EYE_CORNERS]
+    eye_ratio = ((x[..., pf.IRISES] - corners[..., 0]) /
+                 (corners[..., 1] - corners[..., 0])).mean(axis=-1)
+    features = np.empty(x.shape[:-1] + (pf.NUM_FEATURES,), dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features[..., pf.FEATURE_SMILE_RATIO] = np.where(mouth_height < 0.01, 0.0,
+                                                         mouth_width / mouth_height)
+    features[..., pf.FEATURE_LEFT_BROW] = brow_diff[..., 0]
+    features[..., pf.FEATURE_RIGHT_BROW] = brow_diff[..., 1]
+    features[..., pf.FEATURE_EYE_RATIO] = eye_ratio
+    features[..., pf.FEATURE_MOUTH_OPEN] = mouth_opening
+    return features
+
+def bench_features(repeats=2000):
+    """زمن كل مسار لوجه واحد؛ يفشل (رمز خروج 1) إذا اختلفت الخصائص عن المسار السابق"""
+    from mediapipe.framework.formats import landmark_pb2
+    messages = []
+    for gesture in ("neutral", "smile", "eyebrows", "look_left", "look_right", "mouth_open"):
+        message = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in pf.synthetic_face(gesture)[0]:
+            message.landmark.add(x=float(x), y=float(y), z=float(z))
+        messages.append(message)
+    out = np.empty((pf.NUM_LANDMARKS, 3), dtype=np.float32)
+    
+    def current(message):
+        return pf.extract_gesture_features(pf.landmarks_to_array(message, out))
+    
+    paths = [
+        ("attributes (original)", lambda message: legacy_attribute_gestures(message.landmark)),
+        ("list + full array", legacy_array_features),
+        ("serialized + take", current),
+    ]
+    print(f"{'path':>22} {'us/face':>9}")
+    for name, run in paths:
+        best = math.inf
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(repeats // len(messages)):
+                for message in messages:
+                    run(message)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:>22} {best / (repeats // len(messages) * len(messages)) * 1e6:>9.1f}")
+    
+    mismatched = [i for i, message in enumerate(messages)
+                  if not np.array_equal(current(message), legacy_array_features(message))]
+    if mismatched:
+        print("features differ from the previous path for:", mismatched)
+        sys.exit(1)
+
+# ==============================
+# جدولة الاستدلال: وقت المعالج والدقة مقابل الإطار كاملاً في كل مرة
+# ==============================
+def read_video(path, limit=None):
+    """إطارات الفيديو مقلوبة وبصيغة RGB كما يجهزها CameraPreview"""
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB))
+    capture.release()
+    return frames
+
+def run_inference(frames, scheduler=None):
+    """المعالم لكل إطار ووقت المعالج الكلي (يشمل خيوط Mediapipe)"""
+    face_mesh = pf.create_face_mesh()
+    faces = pf.NO_FACES
+    results = []
+    start = time.process_time()
+    for frame in frames:
+        run, roi = scheduler.plan() if scheduler is not None else (True, None)
+        if run:
+            faces = pf.process_face_mesh(face_mesh, frame, roi)
+            if scheduler is not None:
+                scheduler.observe(faces, roi)
+        results.append(faces)
+    cpu = time.process_time() - start
+    face_mesh.close()
+    return results, cpu
+
+def bench_inference(video_path=None, limit=None):
+    if video_path is None:
+        raise SystemExit("the inference benchmark needs a face video: --video clip.mp4")
+    frames = read_video(video_path, limit)
+    if not frames:
+        raise SystemExit(f"no frames read from {video_path}")
+    baseline, baseline_cpu = run_inference(frames)
+    scheduler = pf.InferenceScheduler(frames[0].shape)
+    scheduled, scheduled_cpu = run_inference(frames, scheduler)
+    
+    # الدقة على الإطارات التي وجد فيها الطرفان وجهاً: خطأ المعالم وتطابق الإيماءات
+    both = [(a[0], b[0]) for a, b in zip(baseline, scheduled) if len(a) and len(b)]
+    detected = sum(bool(len(a)) == bool(len(b)) for a, b in zip(baseline, scheduled))
+    print(f"{len(frames)} frames from {video_path}, schedule: {scheduler.counts}")
+    print(f"{'mode':>9} {'cpu ms/frame':>13}")
+    print(f"{'full':>9} {baseline_cpu / len(frames) * 1000:>13.2f}")
+    print(f"{'scheduled':>9} {scheduled_cpu / len(frames) * 1000:>13.2f} "
+          f"({(1 - scheduled_cpu / baseline_cpu) * 100:.0f}% less CPU)")
+    print(f"face detected in the same frames: {detected / len(frames) * 100:.1f}%")
+    if both:
+        a = np.array([pair[0] for pair in both])
+        b = np.array([pair[1] for pair in both])
+        error = np.linalg.norm(a[..., :2] - b[..., :2], axis=-1)
+        agree = np.mean([pf.classify_gesture(x) == pf.classify_gesture(y)
+                         for x, y in zip(pf.extract_gesture_features(a),
+                                         pf.extract_gesture_features(b))]) * 100
+        print(f"landmark error: mean {error.mean():.4f}, p95 {np.percentile(error, 95):.4f} "
+              f"(normalized), same gesture: {agree:.1f}%")
+
+# ==============================
+# زمن البدء البارد حتى أول إطار تفاعلي
+# ==============================
+# يُشغل في عملية جديدة: يستورد البرنامج ويشغل main() ثم يغلقه بعد أول إطار
+STARTUP_SCRIPT = """
+import os, sys, time
+start = time.perf_counter()
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+sys.path.insert(0, {root!r})
+import pygame
+import project_final as pf
+print("import", time.perf_counter() - start, flush=True)
+pf.CAMERA_URL = {camera!r}
+pf.USE_INFERENCE_WORKER = {worker!r}
+get = pygame.event.get
+calls = []
+def get_until_first_frame(*args, **kwargs):
+    calls.append(None)
+    events = get(*args, **kwargs)
+    if len(calls) > 1:
+        events.append(pygame.event.Event(pygame.QUIT))
+    return events
+pygame.event.get = get_until_first_frame
+try:
+    pf.main()
+except SystemExit:
+    pass
+"""
+
+def silent_camera():
+    """خادم يقبل الاتصال ولا يرسل شيئاً، مثل كاميرا IP معلقة"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections = []
+    threading.Thread(target=lambda: connections.extend(iter(server.accept, None)),
+                     daemon=True).start()
+    return f"http://127.0.0.1:{server.getsockname()[1]}/video"
+
+def bench_startup(camera_url=None, runs=3):
+    camera_url = camera_url or silent_camera()
+    root = os.path.dirname(os.path.abspath(__file__))
+    print(f"camera: {camera_url}")
+    print(f"{'inference':>9} {'import ms':>10} {'first frame ms':>15}")
+    for worker in (True, False):
+        for _ in range(runs):
+            script = STARTUP_SCRIPT.format(root=root, camera=camera_url, worker=worker)
+            start = time.perf_counter()
+            process = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, text=True)
+            import_ms = first_frame_ms = float("nan")
+            for line in process.stdout:
+                if line.startswith("import "):
+                    import_ms = float(line.split()[1]) * 1000
+                elif line.startswith("First interactive frame"):
+                    first_frame_ms = (time.perf_counter() - start) * 1000
+            process.wait()
+            print(f"{'worker' if worker else 'inline':>9} {import_ms:>10.0f} {first_frame_ms:>15.0f}")
+
+# ==============================
+# خريطة كبيرة: الرسم بالقطع مع منطقة عرض متحركة
+# ==============================
+def facility_map(rooms_x=30, rooms_y=20, room=400, seed=0):
+    """خريطة منشأة: غرف بجدران ذات أبواب وعقبات عشوائية داخلها، وأهداف في غرف متباعدة"""
+    rng = random.Random(seed)
+    obstacles = []
+    wall = 20
+    for ry in range(rooms_y):
+        for rx in range(rooms_x):
+            x, y = rx * room, ry * room
+            # جداران لكل غرفة (أعلى ويسار) مع باب في منتصف كل منهما
+            door = 120
+            half = (room - door) // 2
+            obstacles.append(pf.Obstacle(x, y, half, wall, "wall"))
+            obstacles.append(pf.Obstacle(x + half + door, y, half, wall, "wall"))
+            obstacles.append(pf.Obstacle(x, y, wall, half, "wall"))
+            obstacles.append(pf.Obstacle(x, y + half + door, wall, half, "wall"))
+            # غرفة البداية خالية حتى لا يبدأ الكرسي داخل عقبة
+            for _ in range(rng.randint(0, 3) if (rx, ry) != (0, 0) else 0):
+                kind = rng.choice(["cone", "plant"])
+                size = rng.randint(30, 50)
+                obstacles.append(pf.Obstacle(x + rng.randint(60, room - 110),
+                                             y + rng.randint(60, room - 110), size, size, kind))
+    width, height = rooms_x * room, rooms_y * room
+    targets = [((rooms_x - 1) * room + room // 2, room // 2),
+               ((rooms_x - 1) * room + room // 2, (rooms_y - 1) * room + room // 2),
+               (room // 2, (rooms_y - 1) * room + room // 2)]
+    return pf.WorldMap(width, height, obstacles, targets, (room // 2, room // 2, 90))
+
+def bench_world(map_path=None, map_out=None, frames=2000, view_size=(1920, 1080)):
+    pygame.init()
+    if map_path:
+        start = time.perf_counter()
+        world = pf.load_map(map_path)
+        print(f"loaded {map_path} in {(time.perf_counter() - start) * 1000:.0f} ms")
+    else:
+        world = facility_map()
+    if map_out:
+        pf.save_map(world, map_out)
+    print(f"world {world.width}x{world.height}, {len(world.obstacles)} obstacles, "
+          f"{len(world.targets)} targets; a single background surface would need "
+          f"{world.width * world.height * 4 / 2**20:.0f} MiB")
+    
+    screen = pygame.Surface(view_size)
+    viewport = pf.Viewport(*view_size, world.width, world.height)
+    background = pf.ChunkedBackground(world, view_size)
+    # جولة على شكل حلزون حول مركز الخريطة، تمر بأغلب مناطقها
+    scrolled = 0
+    start = time.perf_counter()
+    for i in range(frames):
+        t = i / frames
+        radius = 0.45 * t
+        x = world.width * (0.5 + radius * math.cos(t * 12 * math.pi))
+        y = world.height * (0.5 + radius * math.sin(t * 12 * math.pi))
+        if viewport.follow(x, y) or i == 0:
+            background.render(screen, viewport.x, viewport.y)
+            scrolled += 1
+    elapsed = time.perf_counter() - start
+    chunk_bytes = background.chunk_size ** 2 * 4
+    print(f"{frames} frames, {scrolled} scrolled: {elapsed / frames * 1000:.2f} ms/frame, "
+          f"{elapsed / max(scrolled, 1) * 1000:.2f} ms per scrolled frame")
+    print(f"chunks built {background.built}, cached {len(background.chunks)}/{background.max_chunks} "
+          f"(~{len(background.chunks) * chunk_bytes / 2**20:.0f} MiB)")
+    
+    # المقارنة: رسم كل العقبات الظاهرة مباشرة في كل إطار متحرك (بدون قطع)
+    views = [((i * 37) % (world.width - view_size[0]), (i * 23) % (world.height - view_size[1]))
+             for i in range(200)]
+    start = time.perf_counter()
+    for left, top in views:
+        screen.fill(pf.FLOOR_COLOR)
+        world.obstacles.draw(screen, world.obstacles.overlapping(left, top, left + view_size[0],
+                                                                 top + view_size[1]), (-left, -top))
+    print(f"direct redraw of visible obstacles: {(time.perf_counter() - start) / 200 * 1000:.2f} ms/frame")
+    
+    # تخزين العقبات: كائن لكل عقبة مقابل المصفوفات، والقص بحلقة مقابل NumPy
+    tracemalloc.start()
+    objects = list(world.obstacles)
+    object_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    array_bytes = world.obstacles.rects.nbytes + world.obstacles.codes.nbytes
+    print(f"obstacle storage: objects {object_bytes / len(objects):.0f} B/obstacle, "
+          f"arrays {array_bytes / len(objects):.0f} B/obstacle")
+    start = time.perf_counter()
+    for left, top in views:
+        right, bottom = left + view_size[0], top + view_size[1]
+        [o for o in objects if o.x < right and o.x + o.width >= left and o.y < bottom and o.y + o.height >= top]
+    loop_ms = (time.perf_counter() - start) / len(views) * 1000
+    start = time.perf_counter()
+    for left, top in views:
+        world.obstacles.overlapping(left, top, left + view_size[0], top + view_size[1])
+    array_ms = (time.perf_counter() - start) / len(views) * 1000
+    print(f"culling all obstacles to the view: loop {loop_ms:.3f} ms, arrays {array_ms:.3f} ms")
+
+# ==============================
+# عدة ركاب: عالم واحد مشترك مقابل محاكاة منفصلة لكل راكب
+# ==============================
+def bench_riders(counts=(1, 2, 4, 8), repeats=3):
+    """زمن الإطار (التحكم والفيزياء) مع عدد الركاب، بالسكربت التجريبي لكل راكب"""
+    world = pf.WorldMap(4000, 2000, [], [(2000, 200)], (2000, 1400, 0))
+    script = list(pf.scripted_inputs(pf.DEMO_SCRIPT))
+    print(f"{'riders':>7} {'shared ms/frame':>16} {'separate ms/frame':>18} {'shared/rider':>13} "
+          f"{'features batched us':>20} {'per face us':>12}")
+    base = None
+    for count in counts:
+        inputs = [(np.repeat(faces, count, axis=0), key_mask) for faces, key_mask in script]
+        
+        def shared():
+            sim = pf.Simulation(world.width, world.height, world=world, riders=count)
+            for faces, key_mask in inputs:
+                sim.step(faces, key_mask)
+            return sim
+            
+        def separate():
+            sims = [pf.Simulation(world.width, world.height, world=world) for _ in range(count)]
+            for faces, key_mask in inputs:
+                for i, sim in enumerate(sims):
+                    sim.step(faces[i:i + 1], key_mask)
+                    
+        def timed(run):
+            best = math.inf
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+            return best / len(inputs) * 1000
+            
+        shared_ms = timed(shared)
+        separate_ms = timed(separate)
+        if base is None:
+            base = shared_ms
+        faces = inputs[0][0]
+        start = time.perf_counter()
+        for _ in range(2000):
+            pf.extract_gesture_features(faces)
+        batched_us = (time.perf_counter() - start) / 2000 * 1e6
+        start = time.perf_counter()
+        for _ in range(2000):
+            for face in faces:
+                pf.extract_gesture_features(face)
+        per_face_us = (time.perf_counter() - start) / 2000 * 1e6
+        print(f"{count:>7} {shared_ms:>16.3f} {separate_ms:>18.3f} {shared_ms / base / count:>12.2f}x "
+              f"{batched_us:>20.1f} {per_face_us:>12.1f}")
+    result = shared().summary()
+    print("collisions (chairs side by side, same script):", sum(r["collisions"] for r in result["riders"]))
+
+BENCHMARKS = {
+    "collisions": lambda args: bench_collisions(),
+    "starts": lambda args: bench_starts(),
+    "draw": lambda args: bench_draw(),
+    "preview": lambda args: bench_preview(),
+    "latency": lambda args: bench_latency(args.replay, args.budget_ms, args.inference_ms),
+    "gestures": lambda args: bench_gestures(args.replay, args.noise),
+    "features": lambda args: bench_features(),
+    "inference": lambda args: bench_inference(args.video, args.frames),
+    "startup": lambda args: bench_startup(args.camera),
+    "world": lambda args: bench_world(args.map, args.map_out),
+    "riders": lambda args: bench_riders(),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face-Controlled Wheelchair benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--replay", metavar="PATH",
+                        help="session recording for the latency/gestures benchmarks (default: demo script)")
+    parser.add_argument("--budget-ms", type=float, default=200.0,
+                        help="maximum allowed p95 gesture-to-motion latency")
+    parser.add_argument("--inference-ms", type=float, default=0.0,
+                        help="simulated FaceMesh time added to every replayed frame")
+    parser.add_argument("--noise", type=float, default=0.004,
+                        help="landmark noise for the generated gestures session")
+    parser.add_argument("--video", metavar="PATH",
+                        help="face video for the inference benchmark")
+    parser.add_argument("--frames", type=int, help="maximum video frames to use")
+    parser.add_argument("--map", metavar="PATH",
+                        help="world map for the world benchmark (default: generated facility)")
+    parser.add_argument("--map-out", metavar="PATH", help="save the world benchmark map as JSON")
+    parser.add_argument("--camera", metavar="URL",
+                        help="camera for the startup benchmark (default: one that never answers)")
+    args = parser.parse_args()
+    BENCHMARKS[args.name](args)
@@ -1,65 +1,697 @@
 import cv2
-import mediapipe as mp
 import pygame
 import sys
 import time
 import numpy as np
 import math
 import random
+import argparse
+import csv
+import itertools
+import json
+import os
+import struct
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import deque, OrderedDict
+from functools import lru_cache
 
 # ==============================
 # إعدادات أساسية
 # ==============================
-pygame.init()
+# تُهيأ الشاشة والخطوط والكاميرا عند تشغيل الواجهة فقط، حتى يمكن استيراد
+# الملف وتشغيل المحاكاة بدون شاشة (وضع headless)
+screen = None
+WIDTH, HEIGHT = 1280, 720  # حجم العالم الافتراضي قبل فتح الشاشة
+font = small_font = title_font = None
 
-# استخدام وضع الشاشة الكاملة
-screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
-WIDTH, HEIGHT = screen.get_size()
-pygame.display.set_caption("Face-Controlled Wheelchair - REALISTIC SIMULATION")
+class Deferred:
+    """تشغيل تهيئة بطيئة في خيط خلفي واستلام نتيجتها عند الحاجة"""
+    def __init__(self, func, *args):
+        self.value = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(func, args), daemon=True)
+        self.thread.start()
+        
+    def _run(self, func, args):
+        try:
+            self.value = func(*args)
+        except Exception as error:
+            self.error = error
+            
+    @property
+    def done(self):
+        return not self.thread.is_alive()
+        
+    def result(self):
+        """انتظار انتهاء التهيئة وإرجاع نتيجتها"""
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+# البحث في خطوط النظام (fc-list) يبدأ مع فتح الشاشة ويعمل في الخلفية
+font_lookup = None
+
+class LazyFont:
+    """خط نظام يُحمّل عند أول رسم نص به"""
+    def __init__(self, name, size, bold=False):
+        self.name = name
+        self.size = size
+        self.bold = bold
+        self.font = None
+        
+    def __getattr__(self, attr):
+        if self.font is None:
+            if font_lookup is not None:
+                font_lookup.result()
+            self.font = pygame.font.SysFont(self.name, self.size, bold=self.bold)
+        return getattr(self.font, attr)
 
-# إعداد الخطوط
-font = pygame.font.SysFont("Arial", 24)
-small_font = pygame.font.SysFont("Arial", 18)
-title_font = pygame.font.SysFont("Arial", 32, bold=True)
+def init_display():
+    """فتح نافذة الشاشة الكاملة؛ الخطوط تُحمّل عند أول استخدام"""
+    global screen, WIDTH, HEIGHT, font, small_font, title_font, font_lookup
+    pygame.init()
+    font_lookup = Deferred(pygame.font.get_fonts)
+    
+    # استخدام وضع الشاشة الكاملة
+    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    WIDTH, HEIGHT = screen.get_size()
+    pygame.display.set_caption("Face-Controlled Wheelchair - REALISTIC SIMULATION")
+    
+    # إعداد الخطوط
+    font = LazyFont("Arial", 24)
+    small_font = LazyFont("Arial", 18)
+    title_font = LazyFont("Arial", 32, bold=True)
 
 # إعداد الكاميرا
-try:
-    cap = cv2.VideoCapture("http://192.168.1.2:8080/video")
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    CAMERA_AVAILABLE = True
-except:
-    CAMERA_AVAILABLE = False
-    print("Camera not available, using placeholder")
+CAMERA_URL = "http://192.168.1.2:8080/video"
+
+# أقصى انتظار (ثانية) لفتح الكاميرا أو قراءة إطار منها قبل اعتبارها غير متاحة
+CAMERA_TIMEOUT = 5.0
+
+class FrameGrabber:
+    """قراءة الإطارات من الكاميرا في خيط خلفي حتى لا تتوقف حلقة الرسم على الشبكة
+    
+    الاتصال نفسه يتم في الخيط أيضاً؛ state هي "connecting" ثم "connected" أو "failed"
+    """
+    def __init__(self, source, width=640, height=480, buffer_size=2, timeout=CAMERA_TIMEOUT):
+        self.source = source
+        self.size = (width, height)
+        self.timeout = timeout
+        self.cap = None
+        self.state = "connecting"
+        self.connect_time = None  # مدة الاتصال بالثواني
+        # مخزن محدود: عند امتلائه يُسقط أقدم إطار
+        self.buffer = deque(maxlen=buffer_size)
+        self.lock = threading.Lock()
+        self.frame_index = 0
+        self.dropped_frames = 0
+        self.last_timestamp = None
+        self.running = False
+        self.thread = None
+        
+    def start(self):
+        """تشغيل خيط القراءة"""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+        
+    def _connect(self):
+        start = time.perf_counter()
+        timeout_ms = int(self.timeout * 1000)
+        cap = cv2.VideoCapture(self.source, cv2.CAP_ANY, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms,
+        ])
+        if not cap.isOpened():
+            cap.release()
+            self.state = "failed"
+            print("Camera not available, using placeholder")
+            return False
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.size[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.size[1])
+        self.cap = cap
+        self.connect_time = time.perf_counter() - start
+        self.state = "connected"
+        return True
+        
+    def _run(self):
+        if not self._connect():
+            return
+        try:
+            while self.running:
+                ret, frame = self.cap.read()
+                if not ret:
+                    time.sleep(0.005)
+                    continue
+                timestamp = time.perf_counter()
+                with self.lock:
+                    if len(self.buffer) == self.buffer.maxlen:
+                        self.dropped_frames += 1
+                    self.frame_index += 1
+                    self.buffer.append((frame, timestamp))
+        finally:
+            # الخيط هو من يحرر الكاميرا، حتى لو طُلب الإيقاف أثناء الاتصال
+            self.cap.release()
+                
+    def read(self):
+        """إرجاع أحدث إطار مع وقت التقاطه دون انتظار، أو None إن لم يصل إطار جديد"""
+        with self.lock:
+            if not self.buffer:
+                return None
+            frame, timestamp = self.buffer.pop()
+            # الإطارات الأقدم لم تعد مفيدة
+            self.dropped_frames += len(self.buffer)
+            self.buffer.clear()
+        self.last_timestamp = timestamp
+        return frame, timestamp
+        
+    def release(self):
+        """إيقاف الخيط وتحرير الكاميرا"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+
+# رسم المعالم على المعاينة: "off" أو "sparse" (نقاط الإيماءات فقط) أو "full" (كل الشبكة)
+OVERLAY_MODES = ("off", "sparse", "full")
+# شكل النقطة (+) بقطر 3 بكسل مثل cv2.circle بنصف قطر 1
+DOT_OFFSETS = np.array([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)], dtype=np.intp)
+
+class CameraPreview:
+    """مسار صورة الكاميرا بمخازن محجوزة مسبقاً
+    
+    يُقلب الإطار ويُحوّل إلى RGB مرة واحدة (للاستدلال والعرض معاً)، ثم يُصغّر
+    مباشرة إلى مخزن ثابت يشترك في ذاكرته سطح pygame الثابت (بدون نسخ إضافية)
+    """
+    def __init__(self, size=(280, 210)):
+        self.size = size
+        self.rgb_unflipped = None
+        self.rgb = None
+        self.preview = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        self._surface = None
+        
+    def prepare(self, raw_frame):
+        """تحويل إطار BGR الخام إلى RGB مقلوب أفقياً في المخزن الدائم"""
+        if self.rgb is None or self.rgb.shape != raw_frame.shape:
+            self.rgb_unflipped = np.empty_like(raw_frame)
+            self.rgb = np.empty_like(raw_frame)
+        cv2.cvtColor(raw_frame, cv2.COLOR_BGR2RGB, dst=self.rgb_unflipped)
+        cv2.flip(self.rgb_unflipped, 1, dst=self.rgb)
+        return self.rgb
+        
+    def update(self, faces=(), overlay="full"):
+        """تصغير الإطار الحالي إلى مخزن المعاينة ورسم المعالم عليه"""
+        # أقرب جار: نفس مظهر pygame.transform.scale القديم وأسرع بكثير من INTER_AREA
+        cv2.resize(self.rgb, self.size, dst=self.preview, interpolation=cv2.INTER_NEAREST)
+        if overlay != "off" and len(faces):
+            self.draw_landmarks(np.asarray(faces), overlay)
+            
+    def draw_landmarks(self, faces, overlay):
+        """رسم كل النقاط دفعة واحدة بعملية فهرسة واحدة في NumPy"""
+        points = faces[:, GESTURE_LANDMARKS, :2] if overlay == "sparse" else faces[..., :2]
+        w, h = self.size
+        xs = (points[..., 0] * w).astype(np.intp).reshape(-1, 1) + DOT_OFFSETS[:, 0]
+        ys = (points[..., 1] * h).astype(np.intp).reshape(-1, 1) + DOT_OFFSETS[:, 1]
+        inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        self.preview[ys[inside], xs[inside]] = (0, 255, 0)
+        
+    @property
+    def surface(self):
+        # السطح يقرأ من self.preview مباشرة، فيكفي تحديث المصفوفة
+        if self._surface is None:
+            self._surface = pygame.image.frombuffer(self.preview, self.size, "RGB")
+        return self._surface
+
+camera = None
+cameras = []
+CAMERA_AVAILABLE = False
+
+def init_camera(sources=None):
+    """الاتصال بالكاميرات (CAMERA_URL افتراضياً) وبدء خيوط القراءة"""
+    global camera, cameras, CAMERA_AVAILABLE
+    try:
+        cameras = [FrameGrabber(source).start() for source in (sources or [CAMERA_URL])]
+        camera = cameras[0]
+        CAMERA_AVAILABLE = True
+    except:
+        CAMERA_AVAILABLE = False
+        print("Camera not available, using placeholder")
 
 # إعداد Mediapipe
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.7,
-    min_tracking_confidence=0.7
-)
+NUM_LANDMARKS = 478  # مع refine_landmarks (تشمل القزحية)
+
+# تشغيل الاستدلال في عملية منفصلة حتى لا يبطئ الرسم
+USE_INFERENCE_WORKER = True
+
+# طريقة رسم المعالم على صورة الكاميرا عند البدء (زر L للتبديل)
+OVERLAY_MODE = "full"
+
+# شكل إطار الكاميرا المتوقع، لبدء عملية الاستدلال قبل وصول أول إطار
+CAMERA_FRAME_SHAPE = (480, 640, 3)
+
+def create_face_mesh(max_faces=1):
+    # استيراد Mediapipe يستغرق قرابة ثانية، فيتم عند أول حاجة فقط
+    # (داخل عملية الاستدلال، أو في خيط خلفي في الوضع المباشر)
+    import mediapipe as mp
+    return mp.solutions.face_mesh.FaceMesh(
+        max_num_faces=max_faces,
+        refine_landmarks=True,
+        min_detection_confidence=0.7,
+        min_tracking_confidence=0.7
+    )
+
+# معلم واحد في رسالة FaceMesh المسلسلة حين لا يحمل إلا x و y و z:
+# وسم الحقل المكرر وطوله، ثم وسم كل إحداثية وقيمتها float32
+LANDMARK_RECORD = np.dtype([("tag", "u1"), ("size", "u1"), ("x_tag", "u1"), ("x", "<f4"),
+                            ("y_tag", "u1"), ("y", "<f4"), ("z_tag", "u1"), ("z", "<f4")])
+LANDMARK_TAG_COLUMNS = np.array([0, 1, 2, 7, 12])
+LANDMARK_TAGS = np.array([0x0A, 0x0F, 0x0D, 0x15, 0x1D], dtype=np.uint8)
+
+def landmarks_to_array(face_landmarks, out=None):
+    """تحويل معالم الوجه إلى مصفوفة (N, 3) من نوع float32 مرة واحدة لكل إطار
+    
+    تُقرأ الرسالة المسلسلة بعملية NumPy واحدة بدل المرور على المعالم في Python،
+    وأي شكل آخر للرسالة (visibility مثلاً) يعود إلى الطريقة البطيئة
+    """
+    points = face_landmarks.landmark
+    count = len(points)
+    if out is None:
+        out = np.empty((count, 3), dtype=np.float32)
+    data = face_landmarks.SerializeToString()
+    if len(data) == count * LANDMARK_RECORD.itemsize:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(count, LANDMARK_RECORD.itemsize)
+        if (raw[:, LANDMARK_TAG_COLUMNS] == LANDMARK_TAGS).all():
+            records = np.frombuffer(data, dtype=LANDMARK_RECORD)
+            out[:count, 0] = records["x"]
+            out[:count, 1] = records["y"]
+            out[:count, 2] = records["z"]
+            return out
+    out[:count] = [(p.x, p.y, p.z) for p in points]
+    return out
+
+def process_face_mesh(face_mesh, frame, roi=None, out=None, max_faces=1):
+    """تشغيل FaceMesh على الإطار كاملاً أو على منطقة منه roi=(x, y, w, h) بالبكسل
+    
+    يُرجع المعالم (F, N, 3) بإحداثيات الإطار الكامل المعيارية مهما كانت المنطقة
+    """
+    if out is None:
+        out = np.empty((max_faces, NUM_LANDMARKS, 3), dtype=np.float32)
+    full_h, full_w = frame.shape[:2]
+    if roi is not None:
+        x, y, w, h = roi
+        frame = np.ascontiguousarray(frame[y:y + h, x:x + w])
+    results = face_mesh.process(frame)
+    count = 0
+    for face_landmarks in (results.multi_face_landmarks or [])[:max_faces]:
+        landmarks_to_array(face_landmarks, out[count])
+        count += 1
+    faces = out[:count]
+    if roi is not None and count:
+        # من إحداثيات المنطقة إلى إحداثيات الإطار (z بمقياس العرض مثل x)
+        faces[..., 0] = (faces[..., 0] * w + x) / full_w
+        faces[..., 1] = (faces[..., 1] * h + y) / full_h
+        faces[..., 2] *= w / full_w
+    return faces
+
+def _inference_worker(conn, frame_shm_name, result_shm_name, frame_shape, max_faces, sources=1):
+    """حلقة العملية المنفصلة: تقرأ الإطار من الذاكرة المشتركة وتكتب المعالم فيها
+    
+    لكل مصدر FaceMesh خاص به حتى لا يختلط تتبع الوجوه بين الكاميرات
+    """
+    frame_shm = shared_memory.SharedMemory(name=frame_shm_name)
+    result_shm = shared_memory.SharedMemory(name=result_shm_name)
+    frame_buffer = np.ndarray(frame_shape, dtype=np.uint8, buffer=frame_shm.buf)
+    result_buffer = np.ndarray((max_faces, NUM_LANDMARKS, 3), dtype=np.float32,
+                               buffer=result_shm.buf)
+    worker_meshes = [create_face_mesh(max_faces) for _ in range(sources)]
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            seq, timestamp, roi, source, shape = message
+            frame = frame_buffer if shape == frame_shape else \
+                np.ndarray(shape, dtype=np.uint8, buffer=frame_shm.buf)
+            mesh_start = time.perf_counter()
+            count = len(process_face_mesh(worker_meshes[source], frame, roi, result_buffer, max_faces))
+            mesh_time = time.perf_counter() - mesh_start
+            del frame
+            # نرسل أرقاماً صغيرة فقط (مع زمن FaceMesh للوحة الأزمنة)، أما المعالم فهي في الذاكرة المشتركة
+            conn.send((seq, timestamp, count, mesh_time))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        for worker_mesh in worker_meshes:
+            worker_mesh.close()
+        del frame_buffer, result_buffer
+        frame_shm.close()
+        result_shm.close()
+
+class InferenceWorker:
+    """تشغيل FaceMesh في عملية منفصلة مع الاحتفاظ بأحدث نتيجة فقط
+    
+    sources: عدد الكاميرات التي تتناوب على العملية نفسها (إطار واحد في كل مرة)؛
+    الذاكرة المشتركة تتسع لإطار بحجم frame_shape، ويُقبل أي إطار لا يزيد عنه
+    """
+    def __init__(self, frame_shape, max_faces=1, sources=1):
+        self.frame_shape = tuple(frame_shape)
+        self.max_faces = max_faces
+        self.sources = sources
+        self.capacity = int(np.prod(self.frame_shape))
+        self.frame_shm = shared_memory.SharedMemory(create=True, size=self.capacity)
+        self.result_shm = shared_memory.SharedMemory(create=True, size=max_faces * NUM_LANDMARKS * 3 * 4)
+        self.frame_buffer = np.ndarray(self.frame_shape, dtype=np.uint8, buffer=self.frame_shm.buf)
+        self.result_buffer = np.ndarray((max_faces, NUM_LANDMARKS, 3), dtype=np.float32,
+                                        buffer=self.result_shm.buf)
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_inference_worker,
+            args=(child_conn, self.frame_shm.name, self.result_shm.name, self.frame_shape,
+                  max_faces, sources),
+            daemon=True
+        )
+        self.busy = False
+        self.seq = 0
+        self.faces = np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+        self.timestamp = None
+        self.roi = None  # المنطقة التي أُرسل عليها آخر إطار
+        self.source = 0  # والمصدر الذي جاء منه
+        self.mesh_time = 0.0  # زمن FaceMesh لآخر نتيجة داخل العملية (ثوانٍ)
+        
+    def start(self):
+        self.process.start()
+        return self
+        
+    def submit(self, frame, timestamp, roi=None, source=0):
+        """إرسال إطار (RGB) من المصدر source للاستدلال إذا كانت العملية متفرغة، وإلا يُتجاهل
+        
+        roi=(x, y, w, h): تُنسخ هذه المنطقة فقط ويعمل FaceMesh عليها
+        """
+        if self.busy:
+            return False
+        buffer = self.frame_buffer if frame.shape == self.frame_shape else \
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=self.frame_shm.buf)
+        if roi is None:
+            np.copyto(buffer, frame)
+        else:
+            x, y, w, h = roi
+            np.copyto(buffer[y:y + h, x:x + w], frame[y:y + h, x:x + w])
+        self.seq += 1
+        self.roi = roi
+        self.source = source
+        self.conn.send((self.seq, timestamp, roi, source, frame.shape))
+        self.busy = True
+        return True
+        
+    def poll(self):
+        """استلام النتيجة إن كانت جاهزة دون انتظار؛ يُرجع True عند وصول نتيجة جديدة"""
+        if not self.busy or not self.conn.poll():
+            return False
+        seq, timestamp, count, self.mesh_time = self.conn.recv()
+        self.faces = self.result_buffer[:count].copy()
+        self.timestamp = timestamp
+        self.busy = False
+        return True
+        
+    def close(self):
+        """إيقاف العملية وتحرير الذاكرة المشتركة"""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        del self.frame_buffer, self.result_buffer
+        for shm in (self.frame_shm, self.result_shm):
+            shm.close()
+            shm.unlink()
+
+# ==============================
+# جدولة الاستدلال: منطقة الوجه وتخطي الإطارات الساكنة
+# ==============================
+USE_INFERENCE_SCHEDULER = True
+ROI_MARGIN = 0.35          # توسعة منطقة الوجه من كل جانب (نسبة من ضلعها)
+ROI_MIN_SIZE = 128         # أصغر ضلع للمنطقة بالبكسل
+MOTION_THRESHOLD = 0.002   # متوسط إزاحة معالم الإيماءات بين استدلالين (إحداثيات معيارية)
+MAX_SKIPPED_FRAMES = 2     # أقصى عدد إطارات متتالية تُستخدم فيها آخر معالم بدل الاستدلال
+
+class InferenceScheduler:
+    """يقرر لكل إطار جديد: استدلال على الإطار كاملاً، أو على منطقة الوجه فقط، أو تخطيه
+    
+    المنطقة تُحسب من معالم آخر استدلال وتبقى ثابتة ما دام الوجه داخلها بهامش كافٍ،
+    فلا يتشوش تتبع FaceMesh الداخلي بتحريك الإطار المقصوص في كل مرة. عند فقد الوجه
+    يعود الاستدلال التالي إلى الإطار كاملاً
+    """
+    def __init__(self, frame_shape, max_faces=1, margin=ROI_MARGIN, min_size=ROI_MIN_SIZE,
+                 motion_threshold=MOTION_THRESHOLD, max_skipped=MAX_SKIPPED_FRAMES):
+        self.frame_shape = frame_shape
+        self.height, self.width = frame_shape[:2]
+        self.max_faces = max_faces
+        self.margin = margin
+        self.min_size = min_size
+        self.motion_threshold = motion_threshold
+        self.max_skipped = max_skipped
+        self.counts = {"full": 0, "roi": 0, "skip": 0, "lost": 0}
+        self.reset()
+        
+    def reset(self):
+        self.roi = None
+        self.last_faces = None
+        self.motion = math.inf
+        self.skipped = 0
+        
+    def plan(self):
+        """يُرجع (run, roi): run=False لتخطي الإطار، و roi=None للإطار كاملاً"""
+        if self.roi is None:
+            self.counts["full"] += 1
+            return True, None
+        if self.motion < self.motion_threshold and self.skipped < self.max_skipped:
+            self.skipped += 1
+            self.counts["skip"] += 1
+            return False, None
+        self.skipped = 0
+        self.counts["roi"] += 1
+        return True, self.roi
+        
+    def observe(self, faces, roi):
+        """تحديث التتبع بنتيجة استدلال (F, N, 3) تم على roi"""
+        if not len(faces):
+            if roi is not None:
+                self.counts["lost"] += 1
+            self.reset()
+            return
+        if self.last_faces is not None and len(self.last_faces) == len(faces):
+            moved = faces[:, GESTURE_LANDMARKS, :2] - self.last_faces[:, GESTURE_LANDMARKS, :2]
+            self.motion = float(np.abs(moved).mean())
+        else:
+            self.motion = math.inf
+        self.last_faces = faces
+        # وجه جديد قد يظهر خارج المنطقة، فنبحث في الإطار كاملاً حتى تمتلئ كل الأماكن
+        self.roi = self._fit_roi(faces) if len(faces) == self.max_faces else None
+        
+    def _fit_roi(self, faces):
+        xs = faces[..., 0] * self.width
+        ys = faces[..., 1] * self.height
+        left, right = xs.min(), xs.max()
+        top, bottom = ys.min(), ys.max()
+        face_size = max(right - left, bottom - top)
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            pad = self.margin * face_size / 2
+            # نبقي المنطقة ما دام الوجه داخلها بنصف الهامش ولم يصغر كثيراً بالنسبة لها
+            if (left - pad >= x and right + pad <= x + w and top - pad >= y and
+                    bottom + pad <= y + h and face_size * (1 + 2 * self.margin) * 1.5 >= w):
+                return self.roi
+        size = int(min(max(face_size * (1 + 2 * self.margin), self.min_size),
+                       self.width, self.height))
+        x = int(min(max((left + right) / 2 - size / 2, 0), self.width - size))
+        y = int(min(max((top + bottom) / 2 - size / 2, 0), self.height - size))
+        return (x, y, size, size)
+
+# أقصى إزاحة لمركز الوجه بين استدلالين حتى يبقى مع نفس الراكب (إحداثيات معيارية)
+FACE_TRACK_RADIUS = 0.25
+
+class FaceTracker:
+    """يربط وجوه كل استدلال من كاميرا واحدة بمقاعد ثابتة (راكب لكل مقعد)
+    
+    الوجه يبقى مع أقرب مقعد إلى موضعه السابق، والوجوه الجديدة تأخذ المقاعد الفارغة
+    من اليسار إلى اليمين في الصورة؛ ما يزيد عن عدد المقاعد يُهمل
+    """
+    def __init__(self, seats):
+        self.centers = np.full((seats, 2), np.nan)
+        
+    def assign(self, faces):
+        """يُرجع (أرقام الوجوه المقبولة بالترتيب، مقعد كل منها)"""
+        seats = len(self.centers)
+        if not len(faces):
+            return [], []
+        centers = faces[:, GESTURE_LANDMARKS, :2].mean(axis=1)
+        distance = np.linalg.norm(centers[:, None] - self.centers[None], axis=-1)
+        distance[~(distance <= FACE_TRACK_RADIUS)] = np.inf
+        seat_of = {}
+        free = list(range(seats))
+        for flat in np.argsort(distance, axis=None):
+            face, seat = divmod(int(flat), seats)
+            if not np.isfinite(distance[face, seat]):
+                break
+            if face not in seat_of and seat in free:
+                seat_of[face] = seat
+                free.remove(seat)
+        for face in sorted(set(range(len(faces))) - seat_of.keys(), key=lambda f: centers[f, 0]):
+            if not free:
+                break
+            seat_of[face] = free.pop(0)
+        accepted = sorted(seat_of)
+        assigned = [seat_of[face] for face in accepted]
+        self.centers[assigned] = centers[accepted]
+        return accepted, assigned
+
+# أقصى عمر لنتيجة الاستدلال منذ التقاط إطارها (ثوانٍ): إذا توقفت الكاميرا أو عملية
+# الاستدلال تُعامل النتيجة الأقدم كعدم وجود وجه فيتوقف الكرسي بدل تكرار آخر إيماءة
+RESULT_MAX_AGE = 0.3
+
+class CameraSource:
+    """كاميرا واحدة أمام riders راكب: آخر إطار ومعاينته وجدولة الاستدلال عليه
+    وربط وجوهه بالركاب (first_rider هو رقم أول راكب لهذه الكاميرا في المحاكاة)
+    """
+    def __init__(self, grabber, riders=1, first_rider=0, preview_size=(280, 210)):
+        self.grabber = grabber
+        self.riders = riders
+        self.first_rider = first_rider
+        self.preview = CameraPreview(preview_size)
+        self.preview_dirty = False
+        self.tracker = FaceTracker(riders)
+        self.scheduler = None
+        self.raw_frame = None
+        self.frame = None
+        self.capture_time = None
+        self.pending = grabber is None
+        self.state = None
+        self.faces = NO_FACES        # كل الوجوه من آخر استدلال (للرسم على المعاينة)
+        self.rider_faces = NO_FACES  # الوجوه المربوطة بركاب
+        self.slots = []              # رقم الراكب لكل منها
+        self.faces_time = None       # وقت التقاط الإطار الذي جاءت منه (عند أول استخدام فقط)
+        self.result_time = None      # نفس الوقت لكن يبقى لحساب عمر النتيجة
+        
+    def capture(self, blank, connecting, unavailable):
+        """قراءة أحدث إطار أو صورة بديلة بدون انتظار؛ يُرجع True إذا تغير الإطار"""
+        new_frame = self.raw_frame is None
+        if self.grabber is None:
+            self.raw_frame = unavailable
+        else:
+            grabbed = self.grabber.read()
+            if grabbed is not None:
+                self.raw_frame, self.capture_time = grabbed
+                self.pending = True
+                new_frame = True
+            elif self.grabber.state != self.state:
+                # صورة بديلة أثناء الاتصال أو بعد فشله
+                self.state = self.grabber.state
+                if self.state != "connected":
+                    self.raw_frame = connecting if self.state == "connecting" else unavailable
+                    new_frame = True
+            if self.raw_frame is None:
+                self.raw_frame = blank
+        return new_frame
+        
+    def convert(self):
+        """القلب والتحويل إلى RGB (مرة واحدة لكل إطار جديد فقط)"""
+        self.frame = self.preview.prepare(self.raw_frame)
+        self.preview_dirty = True
+        
+    def plan(self):
+        """(run, roi) للإطار المعلق، والجدولة تقرر المنطقة أو التخطي"""
+        self.pending = False
+        if not USE_INFERENCE_SCHEDULER:
+            return True, None
+        if self.scheduler is None or self.scheduler.frame_shape != self.frame.shape:
+            self.scheduler = InferenceScheduler(self.frame.shape, self.riders)
+        return self.scheduler.plan()
+        
+    def observe(self, faces, roi, timestamp):
+        """نتيجة استدلال على إطار من هذا المصدر"""
+        if self.scheduler is not None:
+            self.scheduler.observe(faces, roi)
+        self.faces = faces
+        accepted, seats = self.tracker.assign(faces)
+        self.rider_faces = faces[accepted]
+        self.slots = [self.first_rider + seat for seat in seats]
+        self.faces_time = timestamp
+        self.result_time = timestamp
+        self.preview_dirty = True
+        
+    def expired(self, now, max_age=RESULT_MAX_AGE):
+        """هل مضى على آخر نتيجة أكثر من max_age منذ التقاط إطارها"""
+        return self.result_time is not None and now - self.result_time > max_age
+
+def merge_sources(sources, now):
+    """(faces, slots, capture_times) من آخر نتائج كل المصادر للمحاكاة
+    
+    وقت الالتقاط لكل وجه يُعطى عند أول استخدام لنتيجة مصدره فقط، وإلا None.
+    المصادر التي انتهى عمر نتيجتها لا تُعطي وجوهاً
+    """
+    live = [source for source in sources if not source.expired(now)]
+    if not live:
+        faces = NO_FACES
+    elif len(live) == 1:
+        faces = live[0].rider_faces
+    else:
+        faces = np.concatenate([source.rider_faces for source in live])
+    slots = [slot for source in live for slot in source.slots]
+    times = [source.faces_time for source in live for _ in source.slots]
+    for source in sources:
+        source.faces_time = None
+    return faces, slots, times
+
+def next_source(sources, start):
+    """أول مصدر له إطار معلق بدءاً من start بالتناوب (round-robin)، أو None"""
+    for k in range(len(sources)):
+        index = (start + k) % len(sources)
+        if sources[index].pending and sources[index].frame is not None:
+            return index
+    return None
 
 # ==============================
 # إعداد الكرسي المتحرك (حركة واقعية)
 # ==============================
+# خطوة الفيزياء الثابتة بالثواني؛ السرعات معرّفة لكل ثانية لا لكل إطار
+FIXED_DT = 1 / 120
+# أقصى زمن إطار يُحتسب (بعد تعليق طويل مثلاً) حتى لا تنفذ خطوات كثيرة دفعة واحدة
+MAX_FRAME_DT = 0.25
+# المسافة بين نقاط أثر الحركة (بكسل)، فيمتد الأثر خلف الكرسي بدل أن يختفي تحته
+TRAIL_SPACING = 12
+
 class Wheelchair:
-    def __init__(self, x, y):
+    def __init__(self, x, y, bounds=None):
         self.x = x
         self.y = y
+        self.bounds = bounds  # (العرض, الارتفاع) لحدود العالم، None = حجم الشاشة
         self.width = 120
         self.height = 160
-        self.speed = 5
-        self.rotation_speed = 3  # سرعة الدوران حول المركز
+        self.speed = 300  # بكسل في الثانية
+        self.rotation_speed = 180  # سرعة الدوران حول المركز (درجة في الثانية)
         self.color = (70, 130, 180)
         self.direction = 0  # الزاوية بالدرجات (0 = للأعلى)
         self.wheel_rotation = 0
         self.moving = False
-        self.trail = []
+        self.drive = 0  # 1 = للأمام، -1 = للخلف، 0 = توقف (يحدده التحكم في كل إطار)
+        # الحالة في بداية آخر خطوة فيزياء، للاستيفاء عند الرسم
+        self.prev_x, self.prev_y, self.prev_direction = x, y, 0
+        # أثر الحركة: حلقة ثابتة الحجم تحفظ آخر المواضع، تُكتب فوق الأقدم
         self.max_trail_length = 15
+        self.trail = np.zeros((self.max_trail_length, 2))
+        self.trail_head = 0  # الخانة التي تُكتب فيها النقطة التالية
+        self.trail_count = 0
         self.is_rotating = False
         self.rotation_direction = 0  # 0 = لا دوران, -1 = يسار, 1 = يمين
+        # الاصطدام يُعد عند الانتقال من حركة حرة إلى حركة مرفوضة، فلا يتغير العدد مع طول الخطوة
+        self.collisions = 0
+        self.blocked = False       # هل رُفضت حركة في الخطوة السابقة
+        self.step_blocked = False  # هل رُفضت حركة في الخطوة الحالية
         
     def start_rotation(self, direction):
         """بدء الدوران حول المركز (يسار أو يمين)"""
@@ -71,165 +703,388 @@ class Wheelchair:
         self.is_rotating = False
         self.rotation_direction = 0
         
-    def move_forward(self):
-        """التحرك للأمام في الاتجاه الحالي"""
-        self.moving = True
-        rad = math.radians(self.direction)
-        self.x += math.sin(rad) * self.speed
-        self.y -= math.cos(rad) * self.speed
-        self.wheel_rotation += self.speed * 2
+    def _check_collision(self, new_x, new_y, new_direction, obstacles):
+        """هل يصطدم الكرسي (صندوق مدوّر) بعقبة في الموضع الجديد؟"""
+        if obstacles is None:
+            return False
+        if not obstacles.collides(new_x, new_y, self.width, self.height, new_direction):
+            return False
+        # إذا كان الكرسي متداخلاً مع عقبة من قبل (دفعه حد العالم إليها مثلاً) تُسمح الحركة
+        # التي لا تزيد أي تداخل ولا تبدأ تداخلاً جديداً، حتى يخرج بدل أن يعلق
+        before = obstacles.overlaps(self.x, self.y, self.width, self.height, self.direction)
+        if before:
+            after = obstacles.overlaps(new_x, new_y, self.width, self.height, new_direction)
+            if all(depth <= before.get(key, 0) + 1e-9 for key, depth in after.items()):
+                return False
+        self.step_blocked = True
+        return True
         
-    def move_backward(self):
-        """التحرك للخلف في الاتجاه الحالي"""
+    def move_forward(self, obstacles=None, dt=FIXED_DT):
+        """التحرك للأمام في الاتجاه الحالي لمدة dt ثانية"""
+        distance = self.speed * dt
+        rad = math.radians(self.direction)
+        new_x = self.x + math.sin(rad) * distance
+        new_y = self.y - math.cos(rad) * distance
+        if self._check_collision(new_x, new_y, self.direction, obstacles):
+            return
         self.moving = True
+        self.x, self.y = new_x, new_y
+        self.wheel_rotation += distance * 2
+        
+    def move_backward(self, obstacles=None, dt=FIXED_DT):
+        """التحرك للخلف في الاتجاه الحالي لمدة dt ثانية"""
+        distance = self.speed * dt
         rad = math.radians(self.direction)
-        self.x -= math.sin(rad) * self.speed
-        self.y += math.cos(rad) * self.speed
-        self.wheel_rotation -= self.speed * 2
+        new_x = self.x - math.sin(rad) * distance
+        new_y = self.y + math.cos(rad) * distance
+        if self._check_collision(new_x, new_y, self.direction, obstacles):
+            return
+        self.moving = True
+        self.x, self.y = new_x, new_y
+        self.wheel_rotation -= distance * 2
+        
+    def update(self, obstacles=None, dt=FIXED_DT):
+        """خطوة فيزياء واحدة بطول dt ثانية"""
+        self.prev_x, self.prev_y, self.prev_direction = self.x, self.y, self.direction
+        self.step_blocked = False
+        
+        # تطبيق الحركة التي طلبها التحكم
+        if self.drive > 0:
+            self.move_forward(obstacles, dt)
+        elif self.drive < 0:
+            self.move_backward(obstacles, dt)
         
-    def update(self):
-        """تحديث حالة الكرسي"""
         # تطبيق الدوران إذا كان نشطاً
         if self.is_rotating:
-            self.direction += self.rotation_speed * self.rotation_direction
+            new_direction = self.direction + self.rotation_speed * self.rotation_direction * dt
             # الحفاظ على الزاوية بين 0 و 360
-            if self.direction >= 360:
-                self.direction -= 360
-            elif self.direction < 0:
-                self.direction += 360
+            if new_direction >= 360:
+                new_direction -= 360
+            elif new_direction < 0:
+                new_direction += 360
+            # لا يدور الكرسي إذا كانت زواياه ستدخل في عقبة
+            if not self._check_collision(self.x, self.y, new_direction, obstacles):
+                self.direction = new_direction
+        
+        if self.step_blocked and not self.blocked:
+            self.collisions += 1
+        self.blocked = self.step_blocked
         
         # تحديث أثر الحركة
-        if self.moving and len(self.trail) < self.max_trail_length:
-            self.trail.append((self.x, self.y, self.direction))
+        if self.moving:
+            self._add_trail_point()
         
         self.moving = False
         
         # التأكد من بقاء الكرسي داخل الشاشة
-        self.x = max(self.width//2, min(WIDTH - self.width//2, self.x))
-        self.y = max(self.height//2, min(HEIGHT - self.height//2, self.y))
-        
-    def draw(self, screen):
-        """رسم الكرسي"""
-        # رسم أثر الحركة
-        for i, (x, y, dir) in enumerate(self.trail):
-            alpha = int(100 * (i / len(self.trail)))
-            size = int(8 * (i / len(self.trail)))
-            s = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
-            pygame.draw.circle(s, (70, 130, 180, alpha), (size, size), size)
-            screen.blit(s, (int(x)-size, int(y)-size))
-        
-        # إنشاء سطح للكرسي
-        chair_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-        
-        # رسم هيكل الكرسي الرئيسي
-        pygame.draw.rect(chair_surface, self.color, 
-                        (0, 0, self.width, self.height), 
-                        border_radius=12)
-        
-        # رسم المقعد
-        seat_color = (100, 80, 60)
-        pygame.draw.rect(chair_surface, seat_color, 
-                        (15, 15, self.width-30, self.height-50), 
-                        border_radius=8)
-        
-        # رسم ظهر الكرسي مع مؤشر اتجاه
-        back_color = (90, 70, 50)
-        pygame.draw.rect(chair_surface, back_color, 
-                        (15, 15, self.width-30, 40), 
-                        border_radius=5)
-        
-        # مؤشر اتجاه واضح (سهم أحمر)
-        indicator_color = (255, 50, 50)
-        pygame.draw.polygon(chair_surface, indicator_color, [
-            (self.width//2, 10),
-            (self.width//2 - 15, 35),
-            (self.width//2 + 15, 35)
-        ])
+        world_width, world_height = self.bounds or (WIDTH, HEIGHT)
+        self.x = max(self.width//2, min(world_width - self.width//2, self.x))
+        self.y = max(self.height//2, min(world_height - self.height//2, self.y))
         
-        # رسم العجلات الخلفية
-        wheel_color = (30, 30, 30)
-        wheel_width = 20
-        wheel_height = 40
+    def _add_trail_point(self):
+        """إضافة الموضع الحالي إلى الأثر إذا ابتعد الكرسي TRAIL_SPACING عن آخر نقطة"""
+        if self.trail_count:
+            last_x, last_y = self.trail[self.trail_head - 1]
+            if math.hypot(self.x - last_x, self.y - last_y) < TRAIL_SPACING:
+                return
+        self.trail[self.trail_head] = self.x, self.y
+        self.trail_head = (self.trail_head + 1) % self.max_trail_length
+        self.trail_count = min(self.trail_count + 1, self.max_trail_length)
         
-        pygame.draw.ellipse(chair_surface, wheel_color, 
-                          (-wheel_width//2, self.height//2 - wheel_height//2, 
-                           wheel_width, wheel_height))
+    def trail_points(self):
+        """نقاط الأثر من الأقدم إلى الأحدث"""
+        if self.trail_count < self.max_trail_length:
+            return self.trail[:self.trail_count]
+        return np.roll(self.trail, -self.trail_head, axis=0)
         
-        pygame.draw.ellipse(chair_surface, wheel_color, 
-                          (self.width - wheel_width//2, self.height//2 - wheel_height//2, 
-                           wheel_width, wheel_height))
+    def interpolated(self, alpha):
+        """الموضع والاتجاه بين آخر خطوتي فيزياء (alpha من 0 إلى 1)"""
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        # أقصر طريق بين الزاويتين (عند عبور 0/360)
+        turn = (self.direction - self.prev_direction + 180) % 360 - 180
+        return x, y, (self.prev_direction + turn * alpha) % 360
         
-        # رسم العجلات الأمامية مع دوران
-        front_wheel_size = 25
-        front_wheel_color = (40, 40, 40)
+    def draw(self, screen, alpha=1.0, offset=(0, 0)):
+        """رسم الكرسي، ويُرجع المناطق التي تغيرت على الشاشة
         
-        wheel_x_left = 30
-        wheel_y = self.height - 15
-        pygame.draw.circle(chair_surface, front_wheel_color, 
-                         (wheel_x_left, wheel_y), front_wheel_size)
+        offset: إزاحة العالم على الشاشة (سالب موضع منطقة العرض)
+        """
+        dirty = []
+        dx, dy = offset
+        # رسم أثر الحركة: نقاط جاهزة من الذاكرة المؤقتة في استدعاء blits واحد
+        points = self.trail_points()
+        if len(points):
+            fade = np.arange(len(points)) / len(points)
+            sizes = (8 * fade).astype(int)
+            alphas = (100 * fade).astype(int)
+            corners = (points + (dx, dy)).astype(int) - sizes[:, None]
+            dirty.extend(screen.blits([(trail_dot(size, dot_alpha, self.color), corner)
+                                       for size, dot_alpha, corner in
+                                       zip(sizes.tolist(), alphas.tolist(), corners.tolist())]))
         
-        wheel_x_right = self.width - 30
-        pygame.draw.circle(chair_surface, front_wheel_color, 
-                         (wheel_x_right, wheel_y), front_wheel_size)
+        # صورة الكرسي المدوّرة جاهزة من الذاكرة المؤقتة: عملية blit واحدة
+        x, y, direction = self.interpolated(alpha)
+        x += dx
+        y += dy
+        rotated_chair = CHAIR_SPRITES.get(self, direction)
+        rotated_rect = rotated_chair.get_rect(center=(x, y))
+        
+        dirty.append(screen.blit(rotated_chair, rotated_rect))
+        
+        # عرض حالة الدوران
+        if self.is_rotating:
+            rotation_text = TEXT_CACHE.render(small_font, f"Rotating {'Right' if self.rotation_direction == 1 else 'Left'}", 
+                                              (255, 255, 0))
+            dirty.append(screen.blit(rotation_text, (x - 50, y - 80)))
+        return dirty
+
+# ==============================
+# ذاكرة مؤقتة لصور الكرسي
+# ==============================
+def render_chair_surface(width, height, color, wheel_angle):
+    """رسم الكرسي (بدون تدوير) على سطح شفاف"""
+    # إنشاء سطح للكرسي
+    chair_surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    
+    # رسم هيكل الكرسي الرئيسي
+    pygame.draw.rect(chair_surface, color, 
+                    (0, 0, width, height), 
+                    border_radius=12)
+    
+    # رسم المقعد
+    seat_color = (100, 80, 60)
+    pygame.draw.rect(chair_surface, seat_color, 
+                    (15, 15, width-30, height-50), 
+                    border_radius=8)
+    
+    # رسم ظهر الكرسي مع مؤشر اتجاه
+    back_color = (90, 70, 50)
+    pygame.draw.rect(chair_surface, back_color, 
+                    (15, 15, width-30, 40), 
+                    border_radius=5)
+    
+    # مؤشر اتجاه واضح (سهم أحمر)
+    indicator_color = (255, 50, 50)
+    pygame.draw.polygon(chair_surface, indicator_color, [
+        (width//2, 10),
+        (width//2 - 15, 35),
+        (width//2 + 15, 35)
+    ])
+    
+    # رسم العجلات الخلفية
+    wheel_color = (30, 30, 30)
+    wheel_width = 20
+    wheel_height = 40
+    
+    pygame.draw.ellipse(chair_surface, wheel_color, 
+                      (-wheel_width//2, height//2 - wheel_height//2, 
+                       wheel_width, wheel_height))
+    
+    pygame.draw.ellipse(chair_surface, wheel_color, 
+                      (width - wheel_width//2, height//2 - wheel_height//2, 
+                       wheel_width, wheel_height))
+    
+    # رسم العجلات الأمامية مع دوران
+    front_wheel_size = 25
+    front_wheel_color = (40, 40, 40)
+    
+    wheel_x_left = 30
+    wheel_y = height - 15
+    pygame.draw.circle(chair_surface, front_wheel_color, 
+                     (wheel_x_left, wheel_y), front_wheel_size)
+    
+    wheel_x_right = width - 30
+    pygame.draw.circle(chair_surface, front_wheel_color, 
+                     (wheel_x_right, wheel_y), front_wheel_size)
+    
+    # خطوط الدوران على العجلات
+    line_color = (200, 200, 200)
+    angle = wheel_angle
+    rad = math.radians(angle)
+    
+    for wheel_x in [wheel_x_left, wheel_x_right]:
+        start_x = wheel_x + math.sin(rad) * front_wheel_size * 0.8
+        start_y = wheel_y - math.cos(rad) * front_wheel_size * 0.8
+        end_x = wheel_x - math.sin(rad) * front_wheel_size * 0.8
+        end_y = wheel_y + math.cos(rad) * front_wheel_size * 0.8
+        pygame.draw.line(chair_surface, line_color, 
+                       (start_x, start_y), (end_x, end_y), 4)
+    
+    return chair_surface
+
+@lru_cache(maxsize=None)
+def trail_dot(size, alpha, color=(70, 130, 180)):
+    """نقطة أثر الحركة؛ عدد الأحجام والشفافيات والألوان محدود فتُرسم مرة واحدة"""
+    s = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
+    pygame.draw.circle(s, color + (alpha,), (size, size), size)
+    return s
+
+class SpriteCache:
+    """ذاكرة LRU لصور الكرسي المدوّرة، مفتاحها الاتجاه المكمّم وطور العجلات
+    
+    الحجم محدود بعدد البايتات (max_bytes) وتُحذف الصور الأقدم استخداماً أولاً
+    """
+    def __init__(self, angle_step=2, wheel_phases=8, max_bytes=32 * 1024 * 1024):
+        self.angle_step = angle_step
+        self.wheel_phases = wheel_phases
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bases = {}
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
         
-        # خطوط الدوران على العجلات
-        line_color = (200, 200, 200)
-        angle = self.wheel_rotation
-        rad = math.radians(angle)
+    def _key(self, wheelchair, direction):
+        heading = int(round(direction / self.angle_step)) % (360 // self.angle_step)
+        # خط العجلة متماثل كل 180 درجة
+        phase_size = 180 / self.wheel_phases
+        phase = int(round((wheelchair.wheel_rotation % 180) / phase_size)) % self.wheel_phases
+        return (wheelchair.width, wheelchair.height, wheelchair.color, heading, phase)
         
-        for wheel_x in [wheel_x_left, wheel_x_right]:
-            start_x = wheel_x + math.sin(rad) * front_wheel_size * 0.8
-            start_y = wheel_y - math.cos(rad) * front_wheel_size * 0.8
-            end_x = wheel_x - math.sin(rad) * front_wheel_size * 0.8
-            end_y = wheel_y + math.cos(rad) * front_wheel_size * 0.8
-            pygame.draw.line(chair_surface, line_color, 
-                           (start_x, start_y), (end_x, end_y), 4)
+    def get(self, wheelchair, direction=None):
+        """صورة الكرسي؛ direction يتجاوز اتجاه الكرسي (للرسم المستوفى)"""
+        key = self._key(wheelchair, wheelchair.direction if direction is None else direction)
+        sprite = self.entries.get(key)
+        if sprite is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        return self._build(key)
         
-        # تدوير الكرسي حسب الاتجاه
-        rotated_chair = pygame.transform.rotate(chair_surface, self.direction)
-        rotated_rect = rotated_chair.get_rect(center=(self.x, self.y))
+    def _build(self, key):
+        width, height, color, heading, phase = key
+        base_key = (width, height, color, phase)
+        base = self.bases.get(base_key)
+        if base is None:
+            base = render_chair_surface(width, height, color, phase * 180 / self.wheel_phases)
+            self.bases[base_key] = base
+        sprite = pygame.transform.rotate(base, heading * self.angle_step)
         
-        screen.blit(rotated_chair, rotated_rect)
+        self.entries[key] = sprite
+        self.bytes_used += sprite.get_width() * sprite.get_height() * sprite.get_bytesize()
+        while self.bytes_used > self.max_bytes and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.bytes_used -= old.get_width() * old.get_height() * old.get_bytesize()
+        return sprite
         
-        # عرض حالة الدوران
-        if self.is_rotating:
-            rotation_text = small_font.render(f"Rotating {'Right' if self.rotation_direction == 1 else 'Left'}", 
-                                            True, (255, 255, 0))
-            screen.blit(rotation_text, (self.x - 50, self.y - 80))
+    def precompute(self, wheelchair):
+        """تجهيز كل الاتجاهات مسبقاً عند بدء التشغيل (حتى حد الذاكرة)"""
+        for phase in range(self.wheel_phases):
+            for heading in range(360 // self.angle_step):
+                key = (wheelchair.width, wheelchair.height, wheelchair.color, heading, phase)
+                if key not in self.entries:
+                    self._build(key)
+                if self.bytes_used >= self.max_bytes:
+                    return
+
+CHAIR_SPRITES = SpriteCache()
 
 # ==============================
 # العقبات والأهداف
 # ==============================
+# أنواع العقبات؛ رقم النوع هو موضعه في القائمة، والألوان جدول واحد مشترك
+OBSTACLE_TYPES = ("wall", "cone", "plant")
+OBSTACLE_COLORS = ((120, 80, 40), (255, 165, 0), (50, 150, 50))
+OBSTACLE_WALL, OBSTACLE_CONE, OBSTACLE_PLANT = range(len(OBSTACLE_TYPES))
+
+def obstacle_code(obstacle_type):
+    if obstacle_type not in OBSTACLE_TYPES:
+        raise ValueError(f"unknown obstacle type {obstacle_type!r} (expected one of {', '.join(OBSTACLE_TYPES)})")
+    return OBSTACLE_TYPES.index(obstacle_type)
+
+def draw_obstacle(screen, code, x, y, width, height):
+    color = OBSTACLE_COLORS[code]
+    if code == OBSTACLE_WALL:
+        pygame.draw.rect(screen, color, (x, y, width, height))
+    elif code == OBSTACLE_CONE:
+        pygame.draw.polygon(screen, color, [
+            (x, y + height),
+            (x + width//2, y),
+            (x + width, y + height)
+        ])
+    elif code == OBSTACLE_PLANT:
+        pygame.draw.rect(screen, (100, 70, 40), 
+                       (x + width//3, y + height//2, 
+                        width//3, height//2))
+        pygame.draw.circle(screen, color, 
+                         (x + width//2, y + height//3), 
+                         width//3)
+
 class Obstacle:
+    """عقبة واحدة؛ تُستخدم لبناء القوائم، أما المحاكاة فتخزن العقبات في ObstacleArray"""
     def __init__(self, x, y, width, height, obstacle_type="wall"):
         self.x = x
         self.y = y
         self.width = width
         self.height = height
         self.type = obstacle_type
-        self.colors = {
-            "wall": (120, 80, 40),
-            "cone": (255, 165, 0),
-            "plant": (50, 150, 50)
-        }
-        self.color = self.colors.get(obstacle_type, (120, 80, 40))
-        
-    def draw(self, screen):
-        if self.type == "wall":
-            pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
-        elif self.type == "cone":
-            pygame.draw.polygon(screen, self.color, [
-                (self.x, self.y + self.height),
-                (self.x + self.width//2, self.y),
-                (self.x + self.width, self.y + self.height)
-            ])
-        elif self.type == "plant":
-            pygame.draw.rect(screen, (100, 70, 40), 
-                           (self.x + self.width//3, self.y + self.height//2, 
-                            self.width//3, self.height//2))
-            pygame.draw.circle(screen, self.color, 
-                             (self.x + self.width//2, self.y + self.height//3), 
-                             self.width//3)
+        self.code = obstacle_code(obstacle_type)
+        self.color = OBSTACLE_COLORS[self.code]
+        
+    def draw(self, screen, offset=(0, 0)):
+        draw_obstacle(screen, self.code, self.x + offset[0], self.y + offset[1], self.width, self.height)
+
+# أقل عدد من العقبات يُفحص فيه الاصطدام بعمليات المصفوفات بدل حلقة
+VECTORIZED_MIN_OBSTACLES = 32
+
+class ObstacleArray:
+    """العقبات كمصفوفات متوازية بدل كائن لكل عقبة
+    
+    rects: صف (x, y, العرض, الارتفاع) لكل عقبة، codes: رقم النوع في OBSTACLE_TYPES.
+    القص والاصطدام يفحصان عدة عقبات بعملية NumPy واحدة
+    """
+    def __init__(self, rects=(), types=()):
+        self.rects = np.array(rects, dtype=np.float64).reshape(-1, 4)
+        self.codes = np.array([obstacle_code(t) for t in types], dtype=np.uint8)
+        if len(self.codes) != len(self.rects):
+            raise ValueError(f"{len(self.rects)} obstacle rects but {len(self.codes)} types")
+        
+    def __len__(self):
+        return len(self.rects)
+        
+    def __getitem__(self, index):
+        x, y, width, height = self.rects[index].tolist()
+        return Obstacle(x, y, width, height, OBSTACLE_TYPES[self.codes[index]])
+        
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+            
+    def overlapping(self, left, top, right, bottom):
+        """أرقام العقبات (بترتيبها) التي تلمس المستطيل [left, right) × [top, bottom)"""
+        x, y, width, height = self.rects.T
+        mask = (x < right) & (x + width >= left) & (y < bottom) & (y + height >= top)
+        return np.flatnonzero(mask)
+        
+    def draw(self, screen, indices=None, offset=(0, 0)):
+        """رسم العقبات المختارة (أو كلها) بالترتيب"""
+        if indices is None:
+            indices = np.arange(len(self))
+        dx, dy = offset
+        for (x, y, width, height), code in zip(self.rects[indices].tolist(), self.codes[indices].tolist()):
+            draw_obstacle(screen, code, x + dx, y + dy, width, height)
+            
+    def collides(self, x, y, width, height, direction, indices=None):
+        """هل يتقاطع صندوق الكرسي المدوّر مع أي من العقبات المختارة (أو كلها)؟"""
+        rects = self.rects if indices is None else self.rects.take(indices, axis=0)
+        if len(rects) < VECTORIZED_MIN_OBSTACLES:
+            # للعدد القليل (ما تُرجعه الشبكة عادةً) الحلقة العادية أسرع من تكلفة NumPy الثابتة
+            for left, top, w, h in rects.tolist():
+                if box_overlaps_rect(x, y, width / 2, height / 2, direction,
+                                     left, top, left + w, top + h):
+                    return True
+            return False
+        left, top = rects[:, 0], rects[:, 1]
+        right, bottom = left + rects[:, 2], top + rects[:, 3]
+        return bool(boxes_overlap_rects(x, y, width / 2, height / 2, direction,
+                                        left, top, right, bottom).any())
+
+def obstacle_array(obstacles):
+    """تحويل قائمة Obstacle إلى ObstacleArray"""
+    return ObstacleArray([(o.x, o.y, o.width, o.height) for o in obstacles],
+                         [o.type for o in obstacles])
 
 class Target:
     def __init__(self, x, y):
@@ -238,331 +1093,2062 @@ class Target:
         self.radius = 25
         self.color = (255, 50, 50)
         self.pulse = 0
-        self.pulse_speed = 0.05
+        self.pulse_speed = 3.0  # نبضات في الثانية
         
-    def update(self):
-        self.pulse += self.pulse_speed
+    def update(self, dt=FIXED_DT):
+        self.pulse += self.pulse_speed * dt
         if self.pulse > 1:
             self.pulse = 0
             
-    def draw(self, screen):
+    def draw(self, screen, offset=(0, 0)):
+        center = (self.x + offset[0], self.y + offset[1])
         pulse_size = int(8 * math.sin(self.pulse * math.pi))
-        pygame.draw.circle(screen, self.color, (self.x, self.y), self.radius + pulse_size)
-        pygame.draw.circle(screen, (255, 200, 200), (self.x, self.y), self.radius - 4)
+        dirty = pygame.draw.circle(screen, self.color, center, self.radius + pulse_size)
+        pygame.draw.circle(screen, (255, 200, 200), center, self.radius - 4)
+        return dirty
 
 # ==============================
-# دوال التعرف على الإيماءات (مصححة الاتجاهات)
+# نظام الاصطدام (شبكة مكانية منتظمة)
 # ==============================
-def is_smiling(landmarks):
-    left_corner = landmarks[61]
-    right_corner = landmarks[291]
-    upper_lip = landmarks[13]
-    lower_lip = landmarks[14]
+def box_overlaps_rect(cx, cy, half_w, half_h, direction, left, top, right, bottom):
+    """اختبار المحاور الفاصلة (SAT) بين صندوق مدوّر ومستطيل محاذٍ للمحاور"""
+    rad = math.radians(direction)
+    sin_d, cos_d = math.sin(rad), math.cos(rad)
+    # محورا الكرسي: الأمام (sin, -cos) واليمين (cos, sin) كما في move_forward
+    ex = (right - left) / 2
+    ey = (bottom - top) / 2
+    dx = (left + right) / 2 - cx
+    dy = (top + bottom) / 2 - cy
     
-    mouth_width = abs(right_corner.x - left_corner.x)
-    mouth_height = abs(lower_lip.y - upper_lip.y)
-    
-    if mouth_height < 0.01:
+    # محورا العالم
+    if abs(dx) >= ex + half_w * abs(cos_d) + half_h * abs(sin_d):
+        return False
+    if abs(dy) >= ey + half_w * abs(sin_d) + half_h * abs(cos_d):
+        return False
+    # محورا الكرسي
+    if abs(dx * cos_d + dy * sin_d) >= half_w + ex * abs(cos_d) + ey * abs(sin_d):
         return False
+    if abs(dx * sin_d - dy * cos_d) >= half_h + ex * abs(sin_d) + ey * abs(cos_d):
+        return False
+    return True
+
+def boxes_overlap_rects(cx, cy, half_w, half_h, direction, left, top, right, bottom):
+    """نفس اختبار box_overlaps_rect على مصفوفات من المستطيلات؛ يُرجع مصفوفة منطقية"""
+    rad = math.radians(direction)
+    sin_d, cos_d = math.sin(rad), math.cos(rad)
+    ex = (right - left) / 2
+    ey = (bottom - top) / 2
+    dx = (left + right) / 2 - cx
+    dy = (top + bottom) / 2 - cy
     
-    ratio = mouth_width / mouth_height
-    return ratio > 1.6
+    overlap = np.abs(dx) < ex + half_w * abs(cos_d) + half_h * abs(sin_d)
+    overlap &= np.abs(dy) < ey + half_w * abs(sin_d) + half_h * abs(cos_d)
+    overlap &= np.abs(dx * cos_d + dy * sin_d) < half_w + ex * abs(cos_d) + ey * abs(sin_d)
+    overlap &= np.abs(dx * sin_d - dy * cos_d) < half_h + ex * abs(sin_d) + ey * abs(cos_d)
+    return overlap
+
+def box_rect_penetration(cx, cy, half_w, half_h, direction, left, top, right, bottom):
+    """عمق تداخل صندوق مدوّر مع مستطيل: أصغر تداخل على المحاور الأربعة (صفر أو أقل = لا تداخل)"""
+    rad = math.radians(direction)
+    sin_d, cos_d = math.sin(rad), math.cos(rad)
+    ex = (right - left) / 2
+    ey = (bottom - top) / 2
+    dx = (left + right) / 2 - cx
+    dy = (top + bottom) / 2 - cy
+    return min(ex + half_w * abs(cos_d) + half_h * abs(sin_d) - abs(dx),
+               ey + half_w * abs(sin_d) + half_h * abs(cos_d) - abs(dy),
+               half_w + ex * abs(cos_d) + ey * abs(sin_d) - abs(dx * cos_d + dy * sin_d),
+               half_h + ex * abs(sin_d) + ey * abs(cos_d) - abs(dx * sin_d - dy * cos_d))
 
-def are_eyebrows_raised(landmarks):
-    left_eyebrow_y = np.mean([landmarks[i].y for i in [70, 63, 105]])
-    right_eyebrow_y = np.mean([landmarks[i].y for i in [300, 293, 334]])
-    left_eye_top = landmarks[159].y
-    right_eye_top = landmarks[386].y
+class ObstacleGrid:
+    """شبكة منتظمة فوق العقبات: كل خلية تحفظ أرقام العقبات التي تلمسها
     
-    left_diff = left_eye_top - left_eyebrow_y
-    right_diff = right_eye_top - right_eyebrow_y
+    الاستعلام يفحص الخلايا القريبة من الكرسي فقط، لذلك تكلفته لا تكبر مع حجم الخريطة؛
+    obstacles: ObstacleArray (أو قائمة Obstacle تُحوَّل إليها)
+    """
+    def __init__(self, obstacles, cell_size=128):
+        if not isinstance(obstacles, ObstacleArray):
+            obstacles = obstacle_array(obstacles)
+        self.obstacles = obstacles
+        self.cell_size = cell_size
+        self.cells = {}
+        for index, (x, y, width, height) in enumerate(obstacles.rects.tolist()):
+            for cell in self._cells_for(x, y, x + width, y + height):
+                self.cells.setdefault(cell, []).append(index)
+                
+    def _cells_for(self, left, top, right, bottom):
+        size = self.cell_size
+        for cx in range(int(left // size), int(right // size) + 1):
+            for cy in range(int(top // size), int(bottom // size) + 1):
+                yield cx, cy
+                
+    def query(self, left, top, right, bottom):
+        """أرقام العقبات التي قد تتقاطع مع المستطيل المعطى"""
+        candidates = set()
+        for cell in self._cells_for(left, top, right, bottom):
+            indices = self.cells.get(cell)
+            if indices:
+                candidates.update(indices)
+        return candidates
+        
+    def _candidates(self, x, y, width, height, direction):
+        """العقبات في خلايا المستطيل المحيط بالكرسي المدوّر"""
+        half_w, half_h = width / 2, height / 2
+        rad = math.radians(direction)
+        sin_d, cos_d = abs(math.sin(rad)), abs(math.cos(rad))
+        extent_x = half_w * cos_d + half_h * sin_d
+        extent_y = half_w * sin_d + half_h * cos_d
+        return self.query(x - extent_x, y - extent_y, x + extent_x, y + extent_y)
+        
+    def collides(self, x, y, width, height, direction):
+        """هل يتقاطع صندوق الكرسي المدوّر (مركزه x, y) مع أي عقبة؟"""
+        candidates = self._candidates(x, y, width, height, direction)
+        if not candidates:
+            return False
+        return self.obstacles.collides(x, y, width, height, direction, list(candidates))
+        
+    def overlaps(self, x, y, width, height, direction):
+        """{رقم العقبة: عمق التداخل} للعقبات التي يتداخل معها الكرسي"""
+        depths = {}
+        rects = self.obstacles.rects
+        for index in self._candidates(x, y, width, height, direction):
+            left, top, w, h = rects[index].tolist()
+            depth = box_rect_penetration(x, y, width / 2, height / 2, direction,
+                                         left, top, left + w, top + h)
+            if depth > 0:
+                depths[index] = depth
+        return depths
+
+def boxes_overlap(ax, ay, a_half_w, a_half_h, a_direction, bx, by, b_half_w, b_half_h, b_direction):
+    """اختبار المحاور الفاصلة (SAT) بين صندوقين مدوّرين (كرسيين)"""
+    rad_a, rad_b = math.radians(a_direction), math.radians(b_direction)
+    sin_a, cos_a = math.sin(rad_a), math.cos(rad_a)
+    sin_b, cos_b = math.sin(rad_b), math.cos(rad_b)
+    # جيب وجيب تمام الزاوية بين الصندوقين يكفيان لإسقاط كل منهما على محاور الآخر
+    c = abs(math.cos(rad_b - rad_a))
+    s = abs(math.sin(rad_b - rad_a))
+    dx, dy = bx - ax, by - ay
+    
+    # محورا الصندوق الأول: اليمين (cos, sin) والأمام (sin, -cos)
+    if abs(dx * cos_a + dy * sin_a) >= a_half_w + b_half_w * c + b_half_h * s:
+        return False
+    if abs(dx * sin_a - dy * cos_a) >= a_half_h + b_half_w * s + b_half_h * c:
+        return False
+    # محورا الصندوق الثاني
+    if abs(dx * cos_b + dy * sin_b) >= b_half_w + a_half_w * c + a_half_h * s:
+        return False
+    if abs(dx * sin_b - dy * cos_b) >= b_half_h + a_half_w * s + a_half_h * c:
+        return False
+    return True
+
+def boxes_penetration(ax, ay, a_half_w, a_half_h, a_direction, bx, by, b_half_w, b_half_h, b_direction):
+    """عمق تداخل كرسيين: أصغر تداخل على محاور boxes_overlap (صفر أو أقل = لا تداخل)"""
+    rad_a, rad_b = math.radians(a_direction), math.radians(b_direction)
+    sin_a, cos_a = math.sin(rad_a), math.cos(rad_a)
+    sin_b, cos_b = math.sin(rad_b), math.cos(rad_b)
+    c = abs(math.cos(rad_b - rad_a))
+    s = abs(math.sin(rad_b - rad_a))
+    dx, dy = bx - ax, by - ay
+    return min(a_half_w + b_half_w * c + b_half_h * s - abs(dx * cos_a + dy * sin_a),
+               a_half_h + b_half_w * s + b_half_h * c - abs(dx * sin_a - dy * cos_a),
+               b_half_w + a_half_w * c + a_half_h * s - abs(dx * cos_b + dy * sin_b),
+               b_half_h + a_half_w * s + a_half_h * c - abs(dx * sin_b - dy * cos_b))
+
+class SharedCollider:
+    """اصطدام عدة كراسي في عالم واحد: شبكة العقبات مشتركة بينها، والكراسي تصطدم ببعضها
     
-    return left_diff > 0.03 or right_diff > 0.03
+    for_chair(i) يختار الكرسي الذي يتحرك الآن فيُستثنى من الفحص؛ الكراسي تُقرأ بمواضعها
+    الحالية، فيرى كل كرسي حركة من سبقه في نفس الخطوة
+    """
+    def __init__(self, grid, wheelchairs):
+        self.grid = grid
+        self.wheelchairs = wheelchairs
+        self.current = None
+        
+    def for_chair(self, index):
+        self.current = index
+        return self
+        
+    def collides(self, x, y, width, height, direction):
+        if self.grid.collides(x, y, width, height, direction):
+            return True
+        half_w, half_h = width / 2, height / 2
+        radius = math.hypot(half_w, half_h)
+        for index, other in enumerate(self.wheelchairs):
+            if index == self.current:
+                continue
+            other_w, other_h = other.width / 2, other.height / 2
+            # الكراسي البعيدة تُستبعد بمقارنة بسيطة قبل الاختبار الكامل
+            reach = radius + math.hypot(other_w, other_h)
+            if abs(other.x - x) >= reach or abs(other.y - y) >= reach:
+                continue
+            if boxes_overlap(x, y, half_w, half_h, direction,
+                             other.x, other.y, other_w, other_h, other.direction):
+                return True
+        return False
+        
+    def overlaps(self, x, y, width, height, direction):
+        """مثل ObstacleGrid.overlaps مع الكراسي الأخرى (مفتاحها ("chair", رقمها))"""
+        depths = self.grid.overlaps(x, y, width, height, direction)
+        for index, other in enumerate(self.wheelchairs):
+            if index == self.current:
+                continue
+            depth = boxes_penetration(x, y, width / 2, height / 2, direction,
+                                      other.x, other.y, other.width / 2, other.height / 2,
+                                      other.direction)
+            if depth > 0:
+                depths["chair", index] = depth
+        return depths
+
+# ==============================
+# دوال التعرف على الإيماءات (مصححة الاتجاهات)
+# ==============================
+# مؤشرات المعالم المستخدمة في الإيماءات
+MOUTH_CORNERS = np.array([61, 291])
+UPPER_LIP, LOWER_LIP = 13, 14
+EYEBROWS = np.array([[70, 63, 105], [300, 293, 334]])
+EYE_TOPS = np.array([159, 386])
+EYE_CORNERS = np.array([[33, 133], [362, 263]])
+IRISES = np.array([468, 473])
+# كل النقاط التي تدخل في حساب الإيماءات (لوضع الرسم sparse)
+GESTURE_LANDMARKS = np.unique(np.concatenate([
+    MOUTH_CORNERS, [UPPER_LIP, LOWER_LIP], EYEBROWS.ravel(), EYE_TOPS, EYE_CORNERS.ravel(), IRISES
+]))
+
+# ترتيب عناصر متجه الخصائص
+FEATURE_SMILE_RATIO = 0
+FEATURE_LEFT_BROW = 1
+FEATURE_RIGHT_BROW = 2
+FEATURE_EYE_RATIO = 3
+FEATURE_MOUTH_OPEN = 4
+NUM_FEATURES = 5
+
+# مواقع نقاط كل مقياس داخل points[..., GESTURE_LANDMARKS, :] (مرتبة، فيكفي searchsorted)
+GESTURE_MOUTH_CORNERS = np.searchsorted(GESTURE_LANDMARKS, MOUTH_CORNERS)
+GESTURE_UPPER_LIP, GESTURE_LOWER_LIP = np.searchsorted(GESTURE_LANDMARKS, [UPPER_LIP, LOWER_LIP])
+GESTURE_EYEBROWS = np.searchsorted(GESTURE_LANDMARKS, EYEBROWS)
+GESTURE_EYE_TOPS = np.searchsorted(GESTURE_LANDMARKS, EYE_TOPS)
+GESTURE_EYE_CORNERS = np.searchsorted(GESTURE_LANDMARKS, EYE_CORNERS)
+GESTURE_IRISES = np.searchsorted(GESTURE_LANDMARKS, IRISES)
 
-def get_eye_direction(landmarks):
-    left_eye_left = landmarks[33].x
-    left_eye_right = landmarks[133].x  
-    left_iris = landmarks[468].x
+def extract_gesture_features(points):
+    """حساب كل مقاييس الإيماءات من مصفوفة المعالم (..., N, 3) دفعة واحدة
     
-    right_eye_left = landmarks[362].x
-    right_eye_right = landmarks[263].x
-    right_iris = landmarks[473].x
+    تعمل على وجه واحد (N, 3) أو على مجموعة وجوه/إطارات (F, N, 3)
+    وتُرجع متجه خصائص (..., NUM_FEATURES) من نوع float32
+    """
+    # نقاط الإيماءات فقط بعملية take واحدة، والحساب كله على هذه المصفوفة الصغيرة
+    gesture_points = np.take(points, GESTURE_LANDMARKS, axis=-2)
+    x = gesture_points[..., 0]
+    y = gesture_points[..., 1]
     
-    left_ratio = (left_iris - left_eye_left) / (left_eye_right - left_eye_left)
-    right_ratio = (right_iris - right_eye_left) / (right_eye_right - right_eye_left)
+    mouth_width = np.abs(x[..., GESTURE_MOUTH_CORNERS[1]] - x[..., GESTURE_MOUTH_CORNERS[0]])
+    mouth_opening = y[..., GESTURE_LOWER_LIP] - y[..., GESTURE_UPPER_LIP]
+    mouth_height = np.abs(mouth_opening)
     
-    avg_ratio = (left_ratio + right_ratio) / 2
+    # ارتفاع الحواجب عن أعلى العين (يسار، يمين)
+    brows = y[..., GESTURE_EYEBROWS]
+    brow_diff = y[..., GESTURE_EYE_TOPS] - (brows[..., 0] + brows[..., 1] + brows[..., 2]) / 3
+    
+    # موقع القزحية بين زاويتي العين، متوسط العينين
+    corners = x[..., GESTURE_EYE_CORNERS]
+    eye_ratios = ((x[..., GESTURE_IRISES] - corners[..., 0]) /
+                  (corners[..., 1] - corners[..., 0]))
+    
+    features = np.zeros(x.shape[:-1] + (NUM_FEATURES,), dtype=np.float32)
+    # الفم شبه المغلق لا يُعد ابتسامة (يبقى صفراً ولا تُحسب القسمة)
+    np.divide(mouth_width, mouth_height, out=features[..., FEATURE_SMILE_RATIO],
+              where=~(mouth_height < 0.01))
+    features[..., FEATURE_LEFT_BROW] = brow_diff[..., 0]
+    features[..., FEATURE_RIGHT_BROW] = brow_diff[..., 1]
+    features[..., FEATURE_EYE_RATIO] = (eye_ratios[..., 0] + eye_ratios[..., 1]) / 2
+    features[..., FEATURE_MOUTH_OPEN] = mouth_opening
+    return features
+
+# عتبات الإيماءات: (عتبة الدخول، عتبة الخروج)
+# الدوال أدناه تستخدم عتبة الدخول فقط، أما GestureFilter فيبقي الإيماءة فعالة
+# حتى تعبر عتبة الخروج (hysteresis) فلا ترتجف عند الحد
+GESTURE_THRESHOLDS = {
+    "smile": (1.6, 1.45),        # نسبة عرض الفم إلى ارتفاعه >
+    "eyebrows": (0.03, 0.025),   # ارتفاع أي حاجب >
+    "look_left": (0.6, 0.57),    # موقع القزحية >
+    "look_right": (0.4, 0.43),   # موقع القزحية <
+    "mouth_open": (0.05, 0.04),  # فتحة الفم >
+}
+
+def is_smiling(features, thresholds=GESTURE_THRESHOLDS):
+    return features[FEATURE_SMILE_RATIO] > thresholds["smile"][0]
+
+def are_eyebrows_raised(features, thresholds=GESTURE_THRESHOLDS):
+    threshold = thresholds["eyebrows"][0]
+    return features[FEATURE_LEFT_BROW] > threshold or features[FEATURE_RIGHT_BROW] > threshold
+
+def get_eye_direction(features, thresholds=GESTURE_THRESHOLDS):
+    avg_ratio = features[FEATURE_EYE_RATIO]
     
     # تصحيح الاتجاهات: عندما أنظر لليسار، الكرسي يدور لليسار
-    if avg_ratio < 0.4:
+    if avg_ratio < thresholds["look_right"][0]:
         return "right"  # تصحيح: النظر لليسار = دوران لليسار
-    elif avg_ratio > 0.6:
+    elif avg_ratio > thresholds["look_left"][0]:
         return "left"   # تصحيح: النظر لليمين = دوران لليمين
     else:
         return "center"
 
-def is_mouth_open(landmarks):
-    upper_lip = landmarks[13].y
-    lower_lip = landmarks[14].y
-    mouth_openness = lower_lip - upper_lip
-    return mouth_openness > 0.05
+def is_mouth_open(features, thresholds=GESTURE_THRESHOLDS):
+    return features[FEATURE_MOUTH_OPEN] > thresholds["mouth_open"][0]
+
+def classify_gesture(features, thresholds=GESTURE_THRESHOLDS):
+    """تصنيف إطار واحد بدون تنعيم (بنفس أولوية سلسلة if/elif الأصلية)"""
+    if are_eyebrows_raised(features, thresholds):
+        return "forward"
+    elif is_smiling(features, thresholds):
+        return "backward"
+    eye_dir = get_eye_direction(features, thresholds)
+    if eye_dir == "left":
+        return "rotate_left"
+    elif eye_dir == "right":
+        return "rotate_right"
+    elif is_mouth_open(features, thresholds):
+        return "stop"
+    return "neutral"
 
 # ==============================
-# الدالة الرئيسية
+# تنعيم الإيماءات عبر الزمن
+# ==============================
+# ثابت الزمن لتنعيم الخصائص (ثانية)، وعدد الإطارات في نافذة الوسيط
+GESTURE_SMOOTHING_TAU = 0.05
+GESTURE_MEDIAN_WINDOW = 5
+# أقل مدة (ثانية) يجب أن تستمر فيها الإيماءة الجديدة قبل اعتمادها
+# التوقف والعودة للوضع المحايد أسرع من الحركة حفاظاً على السلامة
+GESTURE_DWELL = {
+    "forward": 0.1,
+    "backward": 0.15,
+    "rotate_left": 0.08,
+    "rotate_right": 0.08,
+    "stop": 0.0,
+    "neutral": 0.05,
+}
+
+class GestureFilter:
+    """مصنف إيماءات متدفق لوجه واحد: تنعيم ثم hysteresis ثم مدة بقاء (dwell)
+    
+    الذاكرة والزمن ثابتان لكل إطار: حلقة بطول GESTURE_MEDIAN_WINDOW لوضع
+    "median" أو متوسط أسي واحد لوضع "ema". الوسيط هو الافتراضي لأن نسبة الابتسامة
+    تقفز عند حد ارتفاع الفم، والمتوسط الأسي ينشر هذه القفزات بدل حذفها
+    """
+    def __init__(self, mode="median", thresholds=GESTURE_THRESHOLDS, dwell=GESTURE_DWELL,
+                 tau=GESTURE_SMOOTHING_TAU, window=GESTURE_MEDIAN_WINDOW):
+        if mode not in ("ema", "median"):
+            raise ValueError(f"unknown smoothing mode: {mode}")
+        self.mode = mode
+        self.thresholds = thresholds
+        self.dwell = dwell
+        self.tau = tau
+        self.ring = np.zeros((window, NUM_FEATURES), dtype=np.float32)
+        self.smoothed = np.zeros(NUM_FEATURES, dtype=np.float32)
+        # لقياس زمن الاستجابة: ساعة المرشح (مجموع dt)، ولكل إطار في النافذة تصنيفه
+        # الخام ولحظة التقاطه على هذه الساعة
+        self.clock = 0.0
+        self.raw = [None] * window
+        self.captured = [None] * window
+        self.reset()
+        
+    def reset(self):
+        """نسيان التاريخ (عند فقد الوجه)"""
+        self.samples = 0
+        self.active = dict.fromkeys(self.thresholds, False)
+        self.gesture = "neutral"
+        self.pending = "neutral"
+        self.pending_time = 0.0
+        self.raw[:] = [None] * len(self.raw)
+        self.last_captured = None
+        self.pending_onset = None
+        self.latency = None
+        
+    def _smooth(self, features, dt):
+        if self.samples == 0:
+            self.ring[:] = features
+            self.smoothed[:] = features
+        elif self.mode == "ema":
+            # معامل مشتق من ثابت الزمن فيبقى التنعيم نفسه مع أي معدل إطارات
+            weight = 1.0 - math.exp(-dt / self.tau) if self.tau > 0 else 1.0
+            self.smoothed += weight * (features - self.smoothed)
+        else:
+            self.ring[self.samples % len(self.ring)] = features
+            np.median(self.ring, axis=0, out=self.smoothed)
+        self.samples += 1
+        return self.smoothed
+        
+    def _latch(self, name, value, below=False):
+        """تحديث حالة إيماءة بعتبتي دخول وخروج"""
+        enter, leave = self.thresholds[name]
+        threshold = leave if self.active[name] else enter
+        self.active[name] = value < threshold if below else value > threshold
+        return self.active[name]
+        
+    def _first_seen(self, gesture):
+        """لحظة التقاط أقدم إطار في النافذة صنّفه الخام gesture (أو آخر إطار)"""
+        times = [captured for raw, captured in zip(self.raw, self.captured)
+                 if raw == gesture and captured is not None]
+        return min(times) if times else self.last_captured
+        
+    def update(self, features, dt, capture_delay=None):
+        """إضافة خصائص إطار جديد (NUM_FEATURES,) مر عليه dt ثانية؛ يُرجع الإيماءة المعتمدة
+        
+        capture_delay: الزمن منذ التقاط الإطار (None إذا أعيد استخدام نتيجة سابقة). عندما
+        تُعتمد إيماءة جديدة يصبح latency الزمن من التقاط أول إطار ظهرت فيه إلى الآن، شاملاً
+        التنعيم ومدة البقاء؛ وإلا None
+        """
+        self.clock += dt
+        if capture_delay is not None:
+            self.last_captured = self.clock - capture_delay
+        slot = self.samples % len(self.ring)
+        self.raw[slot] = classify_gesture(features, self.thresholds)
+        self.captured[slot] = self.last_captured
+        smoothed = self._smooth(features, dt)
+        brows = max(smoothed[FEATURE_LEFT_BROW], smoothed[FEATURE_RIGHT_BROW])
+        eye_ratio = smoothed[FEATURE_EYE_RATIO]
+        # تُحدّث كل الحالات في كل إطار حتى لا تتجمد إيماءة خلف أخرى أعلى أولوية
+        eyebrows = self._latch("eyebrows", brows)
+        smile = self._latch("smile", smoothed[FEATURE_SMILE_RATIO])
+        look_left = self._latch("look_left", eye_ratio)
+        look_right = self._latch("look_right", eye_ratio, below=True)
+        mouth_open = self._latch("mouth_open", smoothed[FEATURE_MOUTH_OPEN])
+        
+        if eyebrows:
+            candidate = "forward"
+        elif smile:
+            candidate = "backward"
+        elif look_left:
+            candidate = "rotate_left"
+        elif look_right:
+            candidate = "rotate_right"
+        elif mouth_open:
+            candidate = "stop"
+        else:
+            candidate = "neutral"
+        
+        if candidate != self.pending:
+            self.pending = candidate
+            self.pending_time = 0.0
+            self.pending_onset = self._first_seen(candidate)
+        self.pending_time += dt
+        self.latency = None
+        # هامش صغير حتى لا يضيع إطار بسبب تقريب مجموع dt
+        if candidate != self.gesture and self.pending_time >= self.dwell[candidate] - 1e-9:
+            self.gesture = candidate
+            if self.pending_onset is not None:
+                self.latency = self.clock - self.pending_onset
+        return self.gesture
+
+# ==============================
+# معايرة العتبات لكل مستخدم
+# ==============================
+PROFILE_DIR = "profiles"
+# (الإيماءة، التعليمات على الشاشة، المدة بالثواني)؛ أسماء الإيماءات مفاتيح GESTURE_THRESHOLDS
+CALIBRATION_STEPS = (
+    ("neutral", "Relax your face and look at the screen", 3.0),
+    ("eyebrows", "Raise your eyebrows", 2.0),
+    ("smile", "Smile", 2.0),
+    ("look_left", "Look to the left", 2.0),
+    ("look_right", "Look to the right", 2.0),
+    ("mouth_open", "Open your mouth wide", 2.0),
+)
+CALIBRATION_SETTLE = 0.5  # ثانية في بداية كل خطوة لا تُجمع فيها عينات (وقت تغيير الوجه)
+CALIBRATION_RATE = 60     # أقصى عدد عينات في الثانية، لحجز المخزن مرة واحدة
+CALIBRATION_RETRIES = 2   # مرات إعادة الخطوة التي لم يظهر فيها وجه قبل تجاوزها
+# موضع العتبات بين أعلى الوضع المحايد (p95) وأدنى الإيماءة (p20)
+CALIBRATION_ENTER = 0.5
+CALIBRATION_LEAVE = 0.25
+
+def threshold_signals(features):
+    """قيمة كل عتبة من متجهات الخصائص (F, NUM_FEATURES) -> (F, len(GESTURE_THRESHOLDS))
+    
+    look_right تُعكس إشارتها حتى تصبح كل المقارنات "أكبر من"
+    """
+    return np.stack([
+        features[:, FEATURE_SMILE_RATIO],
+        features[:, [FEATURE_LEFT_BROW, FEATURE_RIGHT_BROW]].max(axis=1),
+        features[:, FEATURE_EYE_RATIO],
+        -features[:, FEATURE_EYE_RATIO],
+        features[:, FEATURE_MOUTH_OPEN],
+    ], axis=1)
+
+def compute_thresholds(samples, labels, steps=CALIBRATION_STEPS):
+    """حساب عتبات المستخدم من عينات المعالم (F, N, 3) ورقم خطوة كل عينة
+    
+    الإيماءة التي لا تنفصل عن الوضع المحايد تبقى على العتبة الافتراضية
+    """
+    signals = threshold_signals(extract_gesture_features(samples))
+    names = [name for name, _, _ in steps]
+    neutral = signals[labels == names.index("neutral")]
+    if not len(neutral):
+        raise ValueError("no neutral samples collected")
+    neutral_high = np.percentile(neutral, 95, axis=0)
+    
+    thresholds = dict(GESTURE_THRESHOLDS)
+    for column, name in enumerate(GESTURE_THRESHOLDS):
+        if name not in names:
+            continue
+        gesture = signals[labels == names.index(name), column]
+        if not len(gesture):
+            continue
+        gap = np.percentile(gesture, 20) - neutral_high[column]
+        if gap <= 0:
+            print(f"Calibration: '{name}' not distinguishable from neutral, keeping default")
+            continue
+        enter = neutral_high[column] + CALIBRATION_ENTER * gap
+        leave = neutral_high[column] + CALIBRATION_LEAVE * gap
+        sign = -1 if name == "look_right" else 1
+        thresholds[name] = (float(sign * enter), float(sign * leave))
+    return thresholds
+
+def user_profile_path(user):
+    safe = "".join(c for c in user if c.isalnum() or c in "-_") or "default"
+    return os.path.join(PROFILE_DIR, f"{safe}.json")
+
+def save_profile(user, thresholds):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(user_profile_path(user), "w") as f:
+        json.dump({"user": user, "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "thresholds": thresholds}, f, indent=2)
+
+def load_profile(user):
+    """عتبات المستخدم المحفوظة، أو None إذا لم يُعاير بعد"""
+    try:
+        with open(user_profile_path(user)) as f:
+            saved = json.load(f)["thresholds"]
+    except (OSError, ValueError, KeyError):
+        return None
+    thresholds = dict(GESTURE_THRESHOLDS)
+    thresholds.update({name: tuple(saved[name]) for name in GESTURE_THRESHOLDS if name in saved})
+    return thresholds
+
+class CalibrationSession:
+    """جمع عينات المعالم لكل خطوة معايرة في مخزن واحد محجوز مسبقاً
+    
+    المؤقت لا يبدأ قبل أول وجه (الكاميرا قد تتأخر في الاتصال)، والخطوة التي تنتهي
+    بلا عينات تُعاد حتى CALIBRATION_RETRIES مرة ثم تُتجاوز
+    """
+    def __init__(self, steps=CALIBRATION_STEPS):
+        self.steps = steps
+        capacity = int(sum(duration for _, _, duration in steps) * CALIBRATION_RATE)
+        self.samples = np.empty((capacity, NUM_LANDMARKS, 3), dtype=np.float32)
+        self.labels = np.empty(capacity, dtype=np.int8)
+        self.count = 0
+        self.step = 0
+        self.step_time = 0.0
+        self.waiting = True
+        self.step_samples = 0
+        self.retries = 0
+        
+    @property
+    def done(self):
+        return self.step >= len(self.steps)
+        
+    def add(self, dt, faces=None):
+        """تقديم الزمن dt ثانية، مع إضافة أول وجه من faces إذا كانت نتيجة جديدة"""
+        if self.done:
+            return
+        has_face = faces is not None and len(faces) > 0
+        if self.waiting:
+            if not has_face:
+                return
+            self.waiting = False
+        if has_face and self.step_time >= CALIBRATION_SETTLE and self.count < len(self.samples):
+            self.samples[self.count] = faces[0]
+            self.labels[self.count] = self.step
+            self.count += 1
+            self.step_samples += 1
+        self.step_time += dt
+        if self.step_time >= self.steps[self.step][2]:
+            if self.step_samples or self.retries >= CALIBRATION_RETRIES:
+                self.step += 1
+                self.retries = 0
+            else:
+                self.retries += 1
+            self.step_time = 0.0
+            self.step_samples = 0
+            
+    def thresholds(self):
+        """عتبات المستخدم، أو None إذا لم تُجمع أي عينة للوضع المحايد"""
+        try:
+            return compute_thresholds(self.samples[:self.count], self.labels[:self.count], self.steps)
+        except ValueError:
+            return None
+        
+    def draw(self, screen, x, y):
+        """تعليمات الخطوة الحالية وشريط تقدمها"""
+        name, prompt, duration = self.steps[min(self.step, len(self.steps) - 1)]
+        panel = pygame.Rect(x, y, 520, 100)
+        pygame.draw.rect(screen, (0, 0, 0), panel)
+        pygame.draw.rect(screen, (100, 100, 100), panel, 2)
+        header = f"Calibration {self.step + 1}/{len(self.steps)}"
+        if self.waiting:
+            header += " - waiting for a face"
+        elif self.retries:
+            header += " - no face seen, repeating this step"
+        screen.blit(TEXT_CACHE.render(small_font, header, (200, 200, 200)), (x + 15, y + 10))
+        screen.blit(TEXT_CACHE.render(font, prompt, (255, 255, 100)), (x + 15, y + 35))
+        bar = pygame.Rect(x + 15, y + 75, 490, 12)
+        pygame.draw.rect(screen, (60, 60, 60), bar)
+        bar.width = int(bar.width * min(self.step_time / duration, 1.0))
+        pygame.draw.rect(screen, (100, 255, 100), bar)
+        return panel
+
+# ==============================
+# الرسم: خلفية ثابتة وتحديث المناطق المتغيرة فقط
 # ==============================
-def main():
-    clock = pygame.time.Clock()
-    wheelchair = Wheelchair(WIDTH // 4, HEIGHT // 2)
+# العالم يُرسم مسبقاً في قطع مربعة بهذا الضلع (بكسل)
+CHUNK_SIZE = 512
+FLOOR_COLOR = (60, 60, 80)
+OUTSIDE_COLOR = (25, 25, 35)  # خارج حدود العالم عندما يكون أصغر من الشاشة
+GRID_SPACING = 80
+
+class ChunkedBackground:
+    """الأرضية والعقبات مرسومة في قطع تُبنى عند أول ظهور لها على الشاشة
+    
+    القطع الأقدم استخداماً تُحذف عند تجاوز max_chunks (ضعف ما يغطي الشاشة)،
+    فتبقى الذاكرة محدودة مهما كبرت الخريطة
+    """
+    def __init__(self, world, view_size, chunk_size=CHUNK_SIZE, max_chunks=None):
+        self.world = world
+        self.chunk_size = chunk_size
+        if max_chunks is None:
+            visible = (math.ceil(view_size[0] / chunk_size) + 1) * (math.ceil(view_size[1] / chunk_size) + 1)
+            max_chunks = 2 * visible
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+        self.built = 0
+        
+    def _keys_in(self, left, top, right, bottom):
+        size = self.chunk_size
+        for cy in range(int(top // size), int(bottom // size) + 1):
+            for cx in range(int(left // size), int(right // size) + 1):
+                yield cx, cy
+                
+    def _build(self, key):
+        cx, cy = key
+        size = self.chunk_size
+        left, top = cx * size, cy * size
+        chunk = pygame.Surface((size, size))
+        if pygame.display.get_surface() is not None:
+            chunk = chunk.convert()
+        chunk.fill(OUTSIDE_COLOR)
+        floor = pygame.Rect(-left, -top, self.world.width, self.world.height).clip(chunk.get_rect())
+        chunk.fill(FLOOR_COLOR, floor)
+        
+        # شبكة أرضية بإحداثيات العالم حتى تتصل الخطوط بين القطع
+        first_x = -left % GRID_SPACING
+        for x in range(floor.left + (first_x - floor.left) % GRID_SPACING, floor.right, GRID_SPACING):
+            pygame.draw.line(chunk, (100, 100, 100, 50), (x, floor.top), (x, floor.bottom - 1), 1)
+        first_y = -top % GRID_SPACING
+        for y in range(floor.top + (first_y - floor.top) % GRID_SPACING, floor.bottom, GRID_SPACING):
+            pygame.draw.line(chunk, (100, 100, 100, 50), (floor.left, y), (floor.right - 1, y), 1)
+        
+        obstacles = self.world.obstacles
+        obstacles.draw(chunk, obstacles.overlapping(left, top, left + size, top + size), (-left, -top))
+        self.built += 1
+        return chunk
+        
+    def chunk(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        chunk = self.chunks[key] = self._build(key)
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return chunk
+        
+    def render(self, surface, view_x, view_y):
+        """رسم منطقة العرض التي يبدأ ركنها عند (view_x, view_y) من العالم على surface"""
+        width, height = surface.get_size()
+        size = self.chunk_size
+        for cx, cy in self._keys_in(view_x, view_y, view_x + width - 1, view_y + height - 1):
+            surface.blit(self.chunk((cx, cy)), (cx * size - view_x, cy * size - view_y))
+            
+class Viewport:
+    """الجزء الظاهر من العالم؛ يتحرك فقط عندما يقترب الكرسي من حافة الشاشة
     
-    # إنشاء عقبات
-    obstacles = [
+    margin: نسبة الشاشة من كل جانب التي يُبقى الكرسي خارجها
+    """
+    def __init__(self, width, height, world_width, world_height, margin=0.3):
+        self.width = width
+        self.height = height
+        self.max_x = max(world_width - width, 0)
+        self.max_y = max(world_height - height, 0)
+        self.margin_x = int(width * margin)
+        self.margin_y = int(height * margin)
+        self.x = self.y = 0
+        
+    @property
+    def offset(self):
+        """الإزاحة التي تُضاف لإحداثيات العالم عند الرسم"""
+        return -self.x, -self.y
+        
+    def follow(self, x, y):
+        """تحريك منطقة العرض لإبقاء (x, y) داخل المنطقة الوسطى؛ يُرجع True إذا تحركت"""
+        new_x = min(max(self.x, int(x) + self.margin_x - self.width), int(x) - self.margin_x)
+        new_y = min(max(self.y, int(y) + self.margin_y - self.height), int(y) - self.margin_y)
+        new_x = min(max(new_x, 0), self.max_x)
+        new_y = min(max(new_y, 0), self.max_y)
+        moved = (new_x, new_y) != (self.x, self.y)
+        self.x, self.y = new_x, new_y
+        return moved
+
+class DirtyRenderer:
+    """يعيد الخلفية تحت ما رُسم في الإطار السابق ويحدّث الشاشة في تلك المناطق فقط"""
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self.previous = []
+        self.current = []
+        self.full_redraw = True
+        
+    def invalidate(self):
+        """طلب رسم الشاشة كاملة في الإطار القادم (بعد شاشة الإيقاف مثلاً)"""
+        self.full_redraw = True
+        
+    def begin(self):
+        """مسح عناصر الإطار السابق بإعادة الخلفية تحتها"""
+        if self.full_redraw:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self.previous:
+                self.screen.blit(self.background, rect, rect)
+        self.current = []
+        
+    def add(self, rects):
+        """تسجيل منطقة (أو قائمة مناطق) تغيرت في هذا الإطار"""
+        if isinstance(rects, pygame.Rect):
+            self.current.append(rects)
+        else:
+            self.current.extend(rects)
+            
+    def present(self):
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            # المناطق القديمة (التي مُسحت) والجديدة معاً
+            pygame.display.update(self.previous + self.current)
+        self.previous = self.current
+
+class TextCache:
+    """ذاكرة LRU للنصوص المرسومة، مفتاحها (النص، الخط، اللون)"""
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        
+    def render(self, font, text, color):
+        key = (text, font, color)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            return surface
+        surface = font.render(text, True, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+TEXT_CACHE = TextCache()
+
+# النصوص التي تتغير كل إطار (الوقت، المسافة، نسبة الاكتشاف) تُحدّث بهذا المعدل فقط
+HUD_SLOW_REFRESH = 0.25  # ثانية
+# الاتجاه يُعرض بخطوات ثابتة داخل [0, 360) فتبقى نصوصه 72 نصاً تعيدها TEXT_CACHE أثناء الدوران
+HEADING_DISPLAY_STEP = 5  # درجة
+
+# ==============================
+# قياس زمن كل مرحلة من الإطار
+# ==============================
+# mesh: زمن FaceMesh نفسه؛ مع عملية الاستدلال يُقاس داخلها ويُسجل في الإطار الذي تصل فيه النتيجة
+PROFILE_STAGES = ("capture", "color", "inference", "mesh", "gestures", "update", "world", "hud", "flip")
+
+class FrameProfiler:
+    """مؤقتات لمراحل الإطار مع نافذة متحركة لحساب p50/p95/p99
+    
+    تُقاس المراحل بالتتابع: begin_frame() ثم lap(اسم المرحلة) بعد كل مرحلة.
+    export_path: ملف .json لملخص النسب المئوية عند الخروج، أو CSV تُكتب فيه الإطارات أولاً بأول
+    """
+    def __init__(self, stages=PROFILE_STAGES, window=600, export_path=None):
+        self.stages = stages
+        self.window = window
+        # مخزن دائري لكل مرحلة (بالثواني) + زمن الإطار الكلي في العمود الأخير
+        self.samples = np.zeros((window, len(stages) + 1))
+        self.count = 0
+        self.index = {stage: i for i, stage in enumerate(stages)}
+        self.current = np.zeros(len(stages) + 1)
+        self.export_path = export_path
+        # الإطارات تُكتب إلى الملف عند انتهائها بدل حفظ الجلسة كلها في الذاكرة
+        self.csv_file = self.csv_writer = None
+        if export_path is not None and not export_path.endswith(".json"):
+            self.csv_file = open(export_path, "w", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(stages + ("frame",))
+        self.frame_start = None
+        self.last = None
+        self.cached_summary = None
+        self.summary_time = 0
+        # عدادات تُعرض تحت الأزمنة وتُحفظ مع ملخص JSON (إطارات الكاميرا المسقطة مثلاً)
+        self.counters = {}
+        
+    def begin_frame(self):
+        self.current[:] = 0
+        self.frame_start = self.last = time.perf_counter()
+        
+    def lap(self, stage):
+        """إضافة الزمن منذ آخر علامة إلى المرحلة المعطاة"""
+        now = time.perf_counter()
+        self.current[self.index[stage]] += now - self.last
+        self.last = now
+        
+    def add(self, stage, seconds):
+        """إضافة زمن قيس خارج التتابع (في عملية أخرى مثلاً)؛ لا يدخل في زمن الإطار الكلي"""
+        self.current[self.index[stage]] += seconds
+        
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        self.current[-1] = self.last - self.frame_start
+        self.samples[self.count % self.window] = self.current
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([f"{value * 1000:.3f}" for value in self.current.tolist()])
+        self.count += 1
+        self.frame_start = None
+        
+    def summary(self):
+        """p50/p95/p99 والمتوسط بالمللي ثانية لكل مرحلة خلال النافذة الحالية"""
+        samples = self.samples[:min(self.count, self.window)] * 1000
+        if not len(samples):
+            return {}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99], axis=0)
+        mean = samples.mean(axis=0)
+        return {name: {"p50": p50[i], "p95": p95[i], "p99": p99[i], "mean": mean[i]}
+                for i, name in enumerate(self.stages + ("frame",))}
+        
+    def draw(self, screen, x, y):
+        """لوحة الأزمنة على الشاشة؛ تُعاد حساب النسب المئوية مرتين في الثانية فقط"""
+        now = time.perf_counter()
+        if self.cached_summary is None or now - self.summary_time >= 0.5:
+            self.cached_summary = self.summary()
+            self.summary_time = now
+        lines = ["stage       p50    p95    p99 (ms)"]
+        for name, stats in self.cached_summary.items():
+            lines.append(f"{name:<9} {stats['p50']:6.2f} {stats['p95']:6.2f} {stats['p99']:6.2f}")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<20} {value:>8}")
+        panel = pygame.Rect(x, y, 300, 12 + 20 * len(lines))
+        pygame.draw.rect(screen, (0, 0, 0), panel)
+        pygame.draw.rect(screen, (100, 100, 100), panel, 2)
+        for i, line in enumerate(lines):
+            screen.blit(TEXT_CACHE.render(small_font, line, (200, 255, 200)), (x + 10, y + 6 + 20 * i))
+        return panel
+        
+    def export(self):
+        """عند الخروج: حفظ ملخص JSON، أو إغلاق ملف CSV الذي كُتبت فيه الإطارات (مللي ثانية)"""
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = self.csv_writer = None
+        elif self.export_path is not None:
+            summary = self.summary()
+            summary["frames"] = self.count
+            summary.update(self.counters)
+            with open(self.export_path, "w") as f:
+                json.dump(summary, f, indent=2)
+
+# ==============================
+# زمن الاستجابة (من التقاط الإطار إلى حركة الكرسي)
+# ==============================
+class LatencyTracker:
+    """مدرّج تكراري لزمن الاستجابة لكل إيماءة بخانات ثابتة (ذاكرة ثابتة)"""
+    def __init__(self, bin_ms=2, max_ms=1000):
+        self.bin_ms = bin_ms
+        self.bins = max_ms // bin_ms
+        self.histograms = {}   # الإيماءة -> عدد العينات في كل خانة (الأخيرة للقيم الأكبر)
+        
+    def record(self, gesture, latency):
+        """تسجيل زمن (بالثواني) لإيماءة"""
+        histogram = self.histograms.get(gesture)
+        if histogram is None:
+            histogram = self.histograms[gesture] = np.zeros(self.bins + 1, dtype=np.int64)
+        histogram[min(int(latency * 1000 / self.bin_ms), self.bins)] += 1
+        
+    def percentile(self, gesture, q):
+        """النسبة المئوية بالمللي ثانية (الحد الأعلى للخانة)"""
+        histogram = self.histograms[gesture]
+        cumulative = np.cumsum(histogram)
+        index = int(np.searchsorted(cumulative, cumulative[-1] * q / 100))
+        return (index + 1) * self.bin_ms
+        
+    def summary(self):
+        return {gesture: {"count": int(histogram.sum()),
+                          "p50": self.percentile(gesture, 50),
+                          "p95": self.percentile(gesture, 95),
+                          "p99": self.percentile(gesture, 99)}
+                for gesture, histogram in self.histograms.items()}
+        
+    def report(self):
+        lines = [f"{'gesture':<13} {'count':>6} {'p50':>6} {'p95':>6} {'p99':>6} (ms)"]
+        for gesture, stats in sorted(self.summary().items()):
+            lines.append(f"{gesture:<13} {stats['count']:>6} {stats['p50']:>6} "
+                         f"{stats['p95']:>6} {stats['p99']:>6}")
+        return "\n".join(lines)
+
+# ==============================
+# منطق المحاكاة (مشترك بين الواجهة ووضع headless)
+# ==============================
+# حالة لوحة المفاتيح كقناع بتات صغير حتى يسهل تسجيله وإعادة تشغيله
+KEY_UP, KEY_DOWN, KEY_LEFT, KEY_RIGHT = 1, 2, 4, 8
+
+def read_key_mask():
+    """قراءة أسهم لوحة المفاتيح الحالية كقناع بتات"""
+    keys = pygame.key.get_pressed()
+    return ((KEY_UP if keys[pygame.K_UP] else 0) |
+            (KEY_DOWN if keys[pygame.K_DOWN] else 0) |
+            (KEY_LEFT if keys[pygame.K_LEFT] else 0) |
+            (KEY_RIGHT if keys[pygame.K_RIGHT] else 0))
+
+# أثر كل إيماءة على الكرسي: (القيادة أو None لتركها، اتجاه الدوران، النص، الحالة)
+GESTURE_CONTROLS = {
+    "forward": (1, 0, "EYEBROWS: Forward", "Eyebrows raised"),
+    "backward": (-1, 0, "SMILE: Backward", "Smile detected"),
+    "rotate_left": (None, -1, "LOOK LEFT: Rotate Left", "Looking left"),
+    "rotate_right": (None, 1, "LOOK RIGHT: Rotate Right", "Looking right"),
+    "stop": (None, 0, "MOUTH OPEN: Stop", "Mouth open"),
+    "neutral": (None, 0, "NEUTRAL: No movement", "Face detected"),
+}
+
+def default_obstacles():
+    return [
         Obstacle(600, 200, 150, 25, "wall"),
         Obstacle(800, 400, 25, 150, "wall"),
         Obstacle(400, 500, 40, 40, "cone"),
         Obstacle(900, 300, 50, 50, "plant"),
         Obstacle(300, 100, 50, 50, "plant")
     ]
+
+# خرائط العالم بصيغة JSON:
+# {"width": 8000, "height": 6000, "start": [x, y, direction],
+#  "targets": [[x, y], ...], "obstacles": [[x, y, width, height, "wall"], ...]}
+# الأهداف تُزار بالترتيب، والجلسة تكتمل عند الوصول إلى آخرها
+class WorldMap:
+    def __init__(self, width, height, obstacles, targets=None, start=None):
+        self.width = width
+        self.height = height
+        if not isinstance(obstacles, ObstacleArray):
+            obstacles = obstacle_array(obstacles)
+        self.obstacles = obstacles
+        self.targets = targets or [(width - 150, height // 2)]
+        self.start = start or (width // 4, height // 2, 0)
+
+def load_map(path):
+    with open(path) as f:
+        data = json.load(f)
+    try:
+        rows = [(x, y, w, h, kind) for x, y, w, h, kind in data.get("obstacles", [])]
+        return WorldMap(int(data["width"]), int(data["height"]),
+                        ObstacleArray([row[:4] for row in rows], [row[4] for row in rows]),
+                        [tuple(target) for target in data.get("targets", [])],
+                        tuple(data["start"]) if "start" in data else None)
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"invalid map file {path}: {error}") from error
+
+def save_map(world, path):
+    with open(path, "w") as f:
+        json.dump({
+            "width": world.width, "height": world.height,
+            "start": list(world.start),
+            "targets": [list(target) for target in world.targets],
+            "obstacles": [rect + [OBSTACLE_TYPES[code]] for rect, code in
+                          zip(world.obstacles.rects.tolist(), world.obstacles.codes.tolist())],
+        }, f)
+
+# ألوان الكراسي لكل راكب بالترتيب، والمسافة بين مواقع البداية (بكسل، بجانب بعضها؛
+# أكبر من قطر الكرسي حتى يستطيع الدوران في مكانه)
+RIDER_COLORS = [(70, 130, 180), (200, 90, 70), (80, 160, 90), (170, 110, 190),
+                (220, 170, 60), (60, 170, 170), (200, 110, 150), (140, 140, 140)]
+RIDER_SPACING = 220
+
+def rider_start(start, index):
+    """الموقع المفضل لبداية الراكب index: بجانب نقطة البداية بالتناوب يميناً ويساراً
     
-    target = Target(WIDTH - 150, HEIGHT // 2)
-    
-    # إحصاءات
-    frame_count = 0
-    detection_count = 0
-    start_time = time.time()
-    distance_traveled = 0
-    last_x, last_y = wheelchair.x, wheelchair.y
-    
-    simulation_state = "running"
-    current_gesture = "neutral"  # تتبع الإيماءة الحالية
-    
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    running = False
-                elif event.key == pygame.K_p:
-                    simulation_state = "paused" if simulation_state == "running" else "running"
-                elif event.key == pygame.K_r:
-                    wheelchair = Wheelchair(WIDTH // 4, HEIGHT // 2)
-                    simulation_state = "running"
-                    start_time = time.time()
-                    distance_traveled = 0
-                    current_gesture = "neutral"
-        
-        if simulation_state != "running":
-            # شاشة الإيقاف
-            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 150))
-            screen.blit(overlay, (0, 0))
-            
-            pause_text = title_font.render("SIMULATION PAUSED", True, (255, 255, 255))
-            continue_text = font.render("Press P to continue or R to reset", True, (200, 200, 200))
-            screen.blit(pause_text, (WIDTH//2 - pause_text.get_width()//2, HEIGHT//2 - 30))
-            screen.blit(continue_text, (WIDTH//2 - continue_text.get_width()//2, HEIGHT//2 + 20))
-            pygame.display.flip()
-            clock.tick(60)
-            continue
-            
-        # قراءة الإطار من الكاميرا
-        if CAMERA_AVAILABLE:
-            ret, frame = cap.read()
-            if not ret:
-                frame = np.zeros((480, 640, 3), dtype=np.uint8)
-        else:
-            frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(frame, "CAMERA NOT AVAILABLE", (150, 240), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            
-        frame_count += 1
-        frame = cv2.flip(frame, 1)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    قد يقع خارج العالم أو على عقبة؛ Simulation.reset يبحث عن أقرب موضع خالٍ منه
+    """
+    x, y, direction = start
+    side = (index + 1) // 2 * (1 if index % 2 else -1) * RIDER_SPACING
+    rad = math.radians(direction)
+    # اتجاه اليمين بالنسبة للكرسي (cos, sin) كما في box_overlaps_rect
+    return x + math.cos(rad) * side, y + math.sin(rad) * side, direction
+
+# خطوة البحث عن موضع بداية خالٍ (بكسل)
+START_SEARCH_STEP = 20
+
+def clear_start(obstacles, x, y, direction, bounds, size=(120, 160), step=START_SEARCH_STEP,
+                max_radius=None):
+    """أقرب موضع إلى (x, y) لا يتداخل فيه الكرسي مع أي عقبة، داخل حدود العالم
+    
+    يُبحث في حلقات متزايدة حول النقطة (حتى max_radius)؛ ValueError إذا لم يوجد موضع خالٍ
+    """
+    width, height = size
+    min_x, max_x = width // 2, bounds[0] - width // 2
+    min_y, max_y = height // 2, bounds[1] - height // 2
+    if not obstacles.collides(x, y, width, height, direction) and \
+            min_x <= x <= max_x and min_y <= y <= max_y:
+        return x, y
+    for ring in range(1, int((max_radius or math.hypot(*bounds)) / step) + 1):
+        radius = ring * step
+        count = max(8, int(2 * math.pi * radius / step))
+        for k in range(count):
+            angle = 2 * math.pi * k / count
+            cx = x + math.cos(angle) * radius
+            cy = y + math.sin(angle) * radius
+            if not (min_x <= cx <= max_x and min_y <= cy <= max_y):
+                continue
+            if not obstacles.collides(cx, cy, width, height, direction):
+                return cx, cy
+    raise ValueError(f"no free start position for a wheelchair near ({x:.0f}, {y:.0f})")
+
+class Rider:
+    """راكب واحد: كرسيه وحالة التحكم والتقدم الخاصة به"""
+    def __init__(self, wheelchair):
+        self.wheelchair = wheelchair
+        self.gesture_filter = None
+        self.current_gesture = "neutral"
+        self.status = "No face detected"
+        self.action = "No movement"
+        self.distance_traveled = 0
+        self.last_x, self.last_y = wheelchair.x, wheelchair.y
+        self.target_index = 0
+        self.completion_time = None
+
+class Simulation:
+    """حالة المحاكاة ومنطقها بدون رسم أو كاميرا
+    
+    التحكم يُطبق مرة لكل إطار، أما الفيزياء فتتقدم بخطوات ثابتة طولها dt.
+    riders: عدد الكراسي في العالم نفسه، كل وجه يقود كرسياً (الوجه i للراكب i ما لم
+    تُعط slots)، ولوحة المفاتيح للراكب الأول. الجلسة تكتمل عندما يصل كل الركاب لآخر هدف
+    """
+    def __init__(self, width, height, obstacles=None, dt=FIXED_DT,
+                 smoothing="median", thresholds=GESTURE_THRESHOLDS, world=None, riders=1):
+        # بدون خريطة: عالم بحجم الشاشة فيه العقبات الافتراضية وهدف واحد
+        if world is None:
+            world = WorldMap(width, height, default_obstacles() if obstacles is None else obstacles)
+        self.world = world
+        self.width = world.width
+        self.height = world.height
+        self.dt = dt
+        # smoothing: "ema" أو "median" أو None للتصنيف الخام إطاراً بإطار
+        self.smoothing = smoothing
+        self.thresholds = thresholds
+        self.num_riders = riders
+        self.accumulator = 0.0
+        self.sim_time = 0.0
+        self.obstacles = world.obstacles
+        self.obstacle_grid = ObstacleGrid(self.obstacles)
+        self.targets = [Target(x, y) for x, y in world.targets]
+        
+        # إحصاءات
+        self.frame_count = 0
+        self.detection_count = 0
+        self.latency = LatencyTracker()
+        self.reset()
+        
+    def reset(self):
+        """إعادة الكراسي إلى نقاط البداية (زر R)"""
+        bounds = (self.width, self.height)
+        self.riders = []
+        self.wheelchairs = []
+        # شبكة العقبات واحدة لكل الكراسي، والكراسي تصطدم ببعضها
+        self.collider = SharedCollider(self.obstacle_grid, self.wheelchairs)
+        for index in range(self.num_riders):
+            x, y, direction = rider_start(self.world.start, index)
+            wheelchair = Wheelchair(x, y, bounds=bounds)
+            size = (wheelchair.width, wheelchair.height)
+            # مربع بقطر الكرسي يكفي ليدور في مكانه
+            room = 2 * math.ceil(math.hypot(*size) / 2)
+            # أقرب موضع خالٍ من العقبات ومن كراسي الركاب السابقين: مع مساحة للدوران إن
+            # وُجدت قريباً، وإلا بحجم الكرسي فقط
+            collider = self.collider.for_chair(index)
+            try:
+                x, y = clear_start(collider, x, y, direction, bounds, (room, room),
+                                   max_radius=RIDER_SPACING)
+            except ValueError:
+                try:
+                    x, y = clear_start(collider, x, y, direction, bounds, size)
+                except ValueError:
+                    raise ValueError(f"no room to start rider {index + 1} of {self.num_riders} "
+                                     f"in the {self.width}x{self.height} world") from None
+            wheelchair.x, wheelchair.y = wheelchair.prev_x, wheelchair.prev_y = x, y
+            wheelchair.direction = wheelchair.prev_direction = direction
+            wheelchair.color = RIDER_COLORS[index % len(RIDER_COLORS)]
+            rider = Rider(wheelchair)
+            self.riders.append(rider)
+            self.wheelchairs.append(wheelchair)
+        self.state = "running"
+        
+    @property
+    def wheelchair(self):
+        """كرسي الراكب الأول"""
+        return self.wheelchairs[0]
+        
+    def rider_target(self, rider):
+        """الهدف الحالي للراكب (أو الأخير بعد وصوله)"""
+        return self.targets[min(rider.target_index, len(self.targets) - 1)]
+        
+    @property
+    def target(self):
+        return self.rider_target(self.riders[0])
+        
+    def set_thresholds(self, thresholds):
+        """استبدال العتبات (بعد المعايرة)؛ المرشحات تُبنى من جديد بالعتبات الجديدة"""
+        self.thresholds = thresholds
+        for rider in self.riders:
+            rider.gesture_filter = None
+        
+    @property
+    def detection_rate(self):
+        frames = self.frame_count * self.num_riders
+        return (self.detection_count / frames * 100) if frames > 0 else 0
+        
+    def step(self, faces, key_mask=0, capture_time=None, frame_dt=1 / 60, slots=None):
+        """إطار واحد: تطبيق لوحة المفاتيح والإيماءات ثم تقديم الفيزياء frame_dt ثانية"""
+        self.apply_controls(faces, key_mask, capture_time, frame_dt, slots)
+        return self.advance(frame_dt)
+        
+    def apply_controls(self, faces, key_mask=0, capture_time=None, frame_dt=1 / 60, slots=None):
+        """تصنيف الإيماءات وتطبيقها مع لوحة المفاتيح على الكراسي
+        
+        capture_time: وقت التقاط الإطار (perf_counter) الذي جاءت منه faces، يُمرر
+        عند أول استخدام للنتيجة فقط لقياس زمن الاستجابة لكل إيماءة؛ أو قائمة بوقت
+        لكل وجه عندما تأتي الوجوه من عدة كاميرات
+        frame_dt: الزمن منذ الإطار السابق، لتنعيم الإيماءات ومدة بقائها
+        slots: رقم الراكب لكل وجه في faces (None = بالترتيب)
+        """
+        self.frame_count += 1
+        times = capture_time if isinstance(capture_time, list) else [capture_time] * len(faces)
+        # خصائص كل الوجوه بعملية واحدة (F, NUM_FEATURES)
+        features = extract_gesture_features(faces) if len(faces) else None
+        rider_faces = [None] * len(self.riders)
+        for i, slot in enumerate(range(len(faces)) if slots is None else slots):
+            if slot < len(self.riders) and rider_faces[slot] is None:
+                rider_faces[slot] = i
+        for index, rider in enumerate(self.riders):
+            face = rider_faces[index]
+            self._control_rider(rider, None if face is None else features[face],
+                                key_mask if index == 0 else 0,
+                                None if face is None else times[face], frame_dt)
         
-        results = face_mesh.process(rgb_frame)
+    def _control_rider(self, rider, features, key_mask, capture_time, frame_dt):
+        wheelchair = rider.wheelchair
+        wheelchair.drive = 0
         
         status = "No face detected"
         action = "No movement"
         new_gesture = "neutral"
         
         # التحكم باللوحة المفاتيح (للتجربة)
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_UP]:
-            wheelchair.move_forward()
+        if key_mask & KEY_UP:
+            wheelchair.drive = 1
             action = "KEY: Forward"
             new_gesture = "forward"
-        elif keys[pygame.K_DOWN]:
-            wheelchair.move_backward() 
+        elif key_mask & KEY_DOWN:
+            wheelchair.drive = -1
             action = "KEY: Backward"
             new_gesture = "backward"
-        elif keys[pygame.K_LEFT]:
+        elif key_mask & KEY_LEFT:
             wheelchair.start_rotation(-1)  # دوران لليسار
             action = "KEY: Rotate Left"
             new_gesture = "rotate_left"
-        elif keys[pygame.K_RIGHT]:
+        elif key_mask & KEY_RIGHT:
             wheelchair.start_rotation(1)   # دوران لليمين
             action = "KEY: Rotate Right"
             new_gesture = "rotate_right"
         else:
             wheelchair.stop_rotation()
         
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                detection_count += 1
-                landmarks = face_landmarks.landmark
+        if features is not None:
+            self.detection_count += 1
+            # زمن الاستجابة يُسجل مرة عند بدء كل إيماءة: من التقاط أول إطار ظهرت فيه إلى تطبيقها
+            delay = None if capture_time is None else time.perf_counter() - capture_time
+            if self.smoothing is None:
+                new_gesture = classify_gesture(features, self.thresholds)
+                latency = delay if new_gesture != rider.current_gesture else None
+            else:
+                if rider.gesture_filter is None:
+                    rider.gesture_filter = GestureFilter(self.smoothing, self.thresholds)
+                new_gesture = rider.gesture_filter.update(features, frame_dt, delay)
+                latency = rider.gesture_filter.latency
+            
+            # تطبيق التحكم بناء على الإيماءات
+            drive, rotation, action, status = GESTURE_CONTROLS[new_gesture]
+            if drive is not None:
+                wheelchair.drive = drive
+            if rotation:
+                wheelchair.start_rotation(rotation)
+            else:
+                wheelchair.stop_rotation()
+            
+            # تحديث الإيماءة الحالية
+            rider.current_gesture = new_gesture
+            
+            if latency is not None:
+                self.latency.record(new_gesture, latency)
+        else:
+            # إذا لم يكن هناك اكتشاف للوجه، توقف عن الدوران
+            wheelchair.stop_rotation()
+            rider.current_gesture = "neutral"
+            if rider.gesture_filter is not None:
+                rider.gesture_filter.reset()
+        
+        rider.status = status
+        rider.action = action
+        
+    def advance(self, frame_dt):
+        """تقديم الفيزياء بخطوات ثابتة تغطي frame_dt؛ يُرجع نسبة الاستيفاء للرسم"""
+        self.accumulator += min(frame_dt, MAX_FRAME_DT)
+        while self.accumulator >= self.dt:
+            self.accumulator -= self.dt
+            if self.state == "running":
+                self.physics_step()
+        return self.accumulator / self.dt
+        
+    def physics_step(self):
+        """خطوة فيزياء واحدة: تحديث الكراسي والأهداف والإحصاءات"""
+        dt = self.dt
+        for index, rider in enumerate(self.riders):
+            wheelchair = rider.wheelchair
+            wheelchair.update(self.collider.for_chair(index), dt)
+        # كل هدف حالي ينبض مرة واحدة حتى لو كان هدف أكثر من راكب
+        for target_index in sorted({min(rider.target_index, len(self.targets) - 1) for rider in self.riders}):
+            self.targets[target_index].update(dt)
+        self.sim_time += dt
+        
+        for rider in self.riders:
+            wheelchair = rider.wheelchair
+            # حساب المسافة المقطوعة
+            rider.distance_traveled += math.sqrt((wheelchair.x - rider.last_x)**2 + (wheelchair.y - rider.last_y)**2)
+            rider.last_x, rider.last_y = wheelchair.x, wheelchair.y
+            
+            # التحقق من الوصول إلى الهدف الحالي، ثم الانتقال للتالي
+            if rider.target_index == len(self.targets):
+                continue
+            target = self.targets[rider.target_index]
+            target_distance = math.sqrt((wheelchair.x - target.x)**2 + (wheelchair.y - target.y)**2)
+            if target_distance < wheelchair.width//2 + target.radius:
+                rider.target_index += 1
+                if rider.target_index == len(self.targets):
+                    rider.completion_time = self.sim_time
+        if all(rider.target_index == len(self.targets) for rider in self.riders):
+            self.state = "completed"
+            
+    def rider_summary(self, rider):
+        wheelchair = rider.wheelchair
+        return {
+            "completed": rider.target_index == len(self.targets),
+            "targets_reached": rider.target_index,
+            "completion_time": rider.completion_time,
+            "distance_traveled": rider.distance_traveled,
+            "collisions": wheelchair.collisions,
+            "x": wheelchair.x,
+            "y": wheelchair.y,
+            "direction": wheelchair.direction,
+        }
+        
+    def summary(self):
+        """ملخص نتائج الجلسة؛ القيم للراكب الأول، ومع أكثر من راكب تُضاف قائمة riders"""
+        rider = self.riders[0]
+        result = {
+            "steps": self.frame_count,
+            "completed": self.state == "completed",
+            "targets_reached": rider.target_index,
+            "sim_time": self.sim_time,
+            "distance_traveled": rider.distance_traveled,
+            "collisions": rider.wheelchair.collisions,
+            "detection_rate": self.detection_rate,
+            "x": rider.wheelchair.x,
+            "y": rider.wheelchair.y,
+            "direction": rider.wheelchair.direction,
+        }
+        if len(self.riders) > 1:
+            result["riders"] = [self.rider_summary(rider) for rider in self.riders]
+        return result
+
+# ==============================
+# وضع headless (بدون شاشة ولا كاميرا)
+# ==============================
+NO_FACES = np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+
+def synthetic_face(gesture="neutral"):
+    """وجه اصطناعي (1, N, 3) يعطي الإيماءة المطلوبة، للسكربتات والاختبار بدون كاميرا"""
+    points = np.full((NUM_LANDMARKS, 3), 0.5, dtype=np.float32)
+    points[EYE_CORNERS[:, 0], 0] = 0.45
+    points[EYE_CORNERS[:, 1], 0] = 0.55
+    points[EYE_TOPS, 1] = 0.40
+    points[EYEBROWS, 1] = 0.39
+    points[MOUTH_CORNERS, 0] = (0.40, 0.60)
+    points[UPPER_LIP, 1] = 0.600
+    points[LOWER_LIP, 1] = 0.605
+    
+    if gesture == "forward":
+        points[EYEBROWS, 1] = 0.35
+    elif gesture == "backward":
+        points[LOWER_LIP, 1] = 0.62
+    elif gesture == "rotate_left":
+        points[IRISES, 0] = 0.54
+    elif gesture == "rotate_right":
+        points[IRISES, 0] = 0.46
+    elif gesture == "stop":
+        points[MOUTH_CORNERS, 0] = (0.45, 0.55)
+        points[LOWER_LIP, 1] = 0.68
+    return points[None]
+
+def scripted_inputs(script):
+    """تحويل سكربت [(الإيماءة, عدد الخطوات), ...] إلى مدخلات لكل خطوة
+    
+    الإيماءة None تعني عدم اكتشاف وجه
+    """
+    for gesture, count in script:
+        faces = NO_FACES if gesture is None else synthetic_face(gesture)
+        for _ in range(count):
+            yield faces, 0
+
+# خطوة فيزياء أكبر في وضع headless للسرعة (خطوة واحدة لكل إطار بمعدل 60)
+HEADLESS_DT = 1 / 60
+
+def run_headless(inputs, width=WIDTH, height=HEIGHT, obstacles=None,
+                 max_steps=None, stop_on_complete=True, dt=HEADLESS_DT,
+                 thresholds=GESTURE_THRESHOLDS, smoothing="median", world=None, riders=1):
+    """تشغيل جلسة بأسرع ما يمكن بدون شاشة ولا كاميرا ولا تحديد لمعدل الإطارات
+    
+    inputs: متتالية من (faces, key_mask) لكل إطار بمعدل 60 إطاراً في الثانية، أو
+    (faces, key_mask, frame_dt, slots) كما في التسجيلات، حيث faces مصفوفة (F, N, 3)
+    """
+    sim = Simulation(width, height, obstacles, dt=dt, smoothing=smoothing, thresholds=thresholds,
+                     world=world, riders=riders)
+    start = time.perf_counter()
+    for item in inputs:
+        if max_steps is not None and sim.frame_count >= max_steps:
+            break
+        faces, key_mask = item[0], item[1]
+        frame_dt = item[2] if len(item) > 2 else 1 / 60
+        slots = item[3] if len(item) > 3 else None
+        sim.step(faces, key_mask, frame_dt=frame_dt, slots=slots)
+        if stop_on_complete and sim.state == "completed":
+            break
+    result = sim.summary()
+    result["wall_time"] = time.perf_counter() - start
+    return result
+
+# سكربت تجريبي: الالتفاف فوق العقبات ثم النزول إلى الهدف
+# (الأطوال تحسب تأخر اعتماد الإيماءات في GestureFilter)
+DEMO_SCRIPT = [
+    ("rotate_right", 28), ("forward", 34),
+    ("rotate_left", 28), ("forward", 52),
+    ("rotate_right", 28), ("forward", 132),
+    ("rotate_right", 28), ("forward", 102)
+]
+
+def headless_demo(runs, dt=HEADLESS_DT):
+    """تشغيل السكربت التجريبي عدة مرات وطباعة السرعة"""
+    start = time.perf_counter()
+    completed = 0
+    for _ in range(runs):
+        result = run_headless(scripted_inputs(DEMO_SCRIPT), dt=dt)
+        completed += result["completed"]
+    elapsed = time.perf_counter() - start
+    print(f"{runs} sessions in {elapsed:.2f}s ({runs / elapsed * 60:.0f} sessions/min), "
+          f"completed: {completed}/{runs}")
+    print(result)
+
+# ==============================
+# تسجيل الجلسات وإعادة تشغيلها
+# ==============================
+# صيغة الملف: ترويسة ثابتة ثم أجزاء (chunks) متتالية، كل جزء فيه:
+#   ترويسة الجزء، timestamps float64[n]، key_masks uint8[n]، face_counts uint8[n]،
+#   face_slots uint8[n, max_faces] (رقم الراكب لكل وجه)، ثم landmarks float32[n, max_faces, N, 3]
+# كل المصفوفات مصطفة على 8 بايت حتى يمكن قراءتها مباشرة عبر mmap.
+# max_faces هو عدد الركاب؛ تسجيلات الإصدار 001 (راكب واحد) لا تحوي face_slots
+RECORDING_MAGIC = b"FWREC002"
+RECORDING_MAGIC_V1 = b"FWREC001"
+# magic, landmarks, max_faces, chunk_frames, عرض وارتفاع العالم (0 = غير معروف)
+RECORDING_HEADER = struct.Struct("<8sIIIII4x")
+CHUNK_HEADER = struct.Struct("<4sI8x")           # b"CHNK", عدد الإطارات
+
+def _padding(size):
+    return (-size) % 8
+
+class SessionRecorder:
+    """تسجيل معالم الوجه وأوقات الإطارات وحالة لوحة المفاتيح في ملف ثنائي مقسم إلى أجزاء"""
+    def __init__(self, path, max_faces=1, chunk_frames=256, world_size=(0, 0)):
+        self.path = path
+        self.max_faces = max_faces
+        self.chunk_frames = chunk_frames
+        self.file = open(path, "wb")
+        self.file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, NUM_LANDMARKS, max_faces,
+                                              chunk_frames, *world_size))
+        
+        # مخازن الجزء الحالي (تُحجز مرة واحدة)
+        self.timestamps = np.zeros(chunk_frames, dtype=np.float64)
+        self.key_masks = np.zeros(chunk_frames, dtype=np.uint8)
+        self.face_counts = np.zeros(chunk_frames, dtype=np.uint8)
+        self.face_slots = np.zeros((chunk_frames, max_faces), dtype=np.uint8)
+        self.landmarks = np.zeros((chunk_frames, max_faces, NUM_LANDMARKS, 3), dtype=np.float32)
+        self.count = 0
+        self.total_frames = 0
+        
+    def append(self, timestamp, key_mask, faces, slots=None):
+        """إضافة إطار واحد؛ faces مصفوفة (F, N, 3)، و slots رقم الراكب لكل وجه (None = بالترتيب)"""
+        i = self.count
+        face_count = min(len(faces), self.max_faces)
+        self.timestamps[i] = timestamp
+        self.key_masks[i] = key_mask
+        self.face_counts[i] = face_count
+        if face_count:
+            self.landmarks[i, :face_count] = faces[:face_count]
+            self.face_slots[i, :face_count] = np.arange(face_count) if slots is None else slots[:face_count]
+        self.count += 1
+        self.total_frames += 1
+        if self.count == self.chunk_frames:
+            self._flush()
+            
+    def _flush(self):
+        n = self.count
+        if n == 0:
+            return
+        self.file.write(CHUNK_HEADER.pack(b"CHNK", n))
+        for array in (self.timestamps, self.key_masks, self.face_counts, self.face_slots, self.landmarks):
+            data = array[:n].tobytes()
+            self.file.write(data)
+            self.file.write(b"\0" * _padding(len(data)))
+        self.count = 0
+        
+    def close(self):
+        if self.file is not None:
+            self._flush()
+            self.file.close()
+            self.file = None
+            
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *exc):
+        self.close()
+
+class SessionReplay:
+    """قراءة تسجيل جلسة عبر mmap؛ المعالم تُقرأ كعروض (views) بدون نسخ
+    
+    التكرار عليها يعطي (faces, key_mask, frame_dt, slots) لكل إطار مثل مدخلات run_headless،
+    حيث frame_dt هو الفرق بين الأوقات المسجلة فتتطابق خطوات الفيزياء مع الجلسة الأصلية
+    """
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, num_landmarks, self.max_faces, self.chunk_frames, width, height = \
+            RECORDING_HEADER.unpack_from(self.data, 0)
+        # حجم العالم وقت التسجيل، لإعادة المحاكاة بنفس الحدود
+        self.world_size = (width, height) if width and height else None
+        if magic not in (RECORDING_MAGIC, RECORDING_MAGIC_V1):
+            raise ValueError(f"{path} is not a session recording")
+        has_slots = magic == RECORDING_MAGIC
+        if num_landmarks != NUM_LANDMARKS:
+            raise ValueError(f"{path} has {num_landmarks} landmarks, expected {NUM_LANDMARKS}")
+        
+        # فهرسة الأجزاء مرة واحدة
+        self.chunks = []
+        offset = RECORDING_HEADER.size
+        while offset + CHUNK_HEADER.size <= len(self.data):
+            tag, n = CHUNK_HEADER.unpack_from(self.data, offset)
+            if tag != b"CHNK":
+                raise ValueError(f"{path}: corrupt chunk at byte {offset}")
+            offset += CHUNK_HEADER.size
+            arrays = []
+            layout = [(np.float64, (n,)), (np.uint8, (n,)), (np.uint8, (n,)),
+                      (np.uint8, (n, self.max_faces)), (np.float32, (n, self.max_faces, NUM_LANDMARKS, 3))]
+            if not has_slots:
+                del layout[3]
+            for dtype, shape in layout:
+                count = int(np.prod(shape))
+                array = np.frombuffer(self.data, dtype=dtype, count=count, offset=offset).reshape(shape)
+                arrays.append(array)
+                size = array.nbytes
+                offset += size + _padding(size)
+            if not has_slots:
+                # الوجوه بالترتيب كما كان يعاملها الإصدار الأول
+                arrays.insert(3, np.broadcast_to(np.arange(self.max_faces, dtype=np.uint8), (n, self.max_faces)))
+            self.chunks.append(arrays)
+        self.length = sum(len(chunk[0]) for chunk in self.chunks)
+        
+    def __len__(self):
+        return self.length
+        
+    @property
+    def timestamps(self):
+        return np.concatenate([chunk[0] for chunk in self.chunks]) if self.chunks else np.zeros(0)
+        
+    def frame(self, index):
+        """(timestamp, key_mask, faces, slots) للإطار المطلوب"""
+        # كل الأجزاء ممتلئة ما عدا الأخير
+        timestamps, key_masks, face_counts, face_slots, landmarks = self.chunks[index // self.chunk_frames]
+        i = index % self.chunk_frames
+        count = face_counts[i]
+        return timestamps[i], int(key_masks[i]), landmarks[i, :count], face_slots[i, :count]
+        
+    def __iter__(self):
+        previous = None
+        for timestamps, key_masks, face_counts, face_slots, landmarks in self.chunks:
+            for i in range(len(timestamps)):
+                timestamp = timestamps[i]
+                frame_dt = 0.0 if previous is None else timestamp - previous
+                previous = timestamp
+                count = face_counts[i]
+                yield landmarks[i, :count], int(key_masks[i]), frame_dt, face_slots[i, :count]
+                
+    def close(self):
+        self.chunks = []
+        self.data = None
+
+# ==============================
+# تشغيل دفعات: جلسات مسجلة × قيم معاملات على كل الأنوية
+# ==============================
+# المعاملات القابلة للمسح: عتبة دخول أي إيماءة، وطريقة التنعيم، وملف مستخدم، وخريطة
+SWEEP_PARAMETERS = tuple(GESTURE_THRESHOLDS) + ("smoothing", "user", "map")
+SMOOTHING_MODES = ("median", "ema", "none")
+BATCH_COLUMNS = ("session", "completed", "completion_time", "distance_traveled",
+                 "collisions", "detection_rate", "steps", "wall_time")
+
+def parse_sweep(specs):
+    """["smile=1.4,1.6", "smoothing=median,ema"] -> قائمة إعدادات بكل التوافيق"""
+    axes = []
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in SWEEP_PARAMETERS or not values:
+            raise ValueError(f"bad sweep '{spec}': expected NAME=V1,V2,... "
+                             f"with NAME one of {', '.join(SWEEP_PARAMETERS)}")
+        values = values.split(",")
+        # القيم تُفحص هنا حتى يظهر الخطأ قبل تشغيل المجمع لا داخل إحدى عملياته
+        if name in GESTURE_THRESHOLDS:
+            try:
+                values = [float(value) for value in values]
+            except ValueError:
+                raise ValueError(f"bad sweep '{spec}': {name} values must be numbers") from None
+        elif name == "smoothing":
+            bad = [value for value in values if value not in SMOOTHING_MODES]
+            if bad:
+                raise ValueError(f"bad sweep '{spec}': unknown smoothing {', '.join(bad)} "
+                                 f"(expected {', '.join(SMOOTHING_MODES)})")
+        elif name == "user":
+            missing = [value for value in values if load_profile(value) is None]
+            if missing:
+                raise ValueError(f"bad sweep '{spec}': no saved profile for {', '.join(missing)}")
+        elif name == "map":
+            for value in values:
+                try:
+                    load_map(value)
+                except OSError as error:
+                    raise ValueError(f"bad sweep '{spec}': {error}") from None
+        axes.append([(name, value) for value in values])
+    return [dict(combination) for combination in itertools.product(*axes)]
+
+def sweep_thresholds(params):
+    """العتبات لإعداد واحد: ملف المستخدم (إن وُجد) ثم قيم الدخول الممسوحة
+    
+    عتبة الخروج تتحرك مع عتبة الدخول فيبقى عرض الـ hysteresis كما هو
+    """
+    thresholds = dict((load_profile(params["user"]) if "user" in params else None)
+                      or GESTURE_THRESHOLDS)
+    for name in GESTURE_THRESHOLDS:
+        if name in params:
+            enter, leave = thresholds[name]
+            thresholds[name] = (params[name], params[name] + leave - enter)
+    return thresholds
+
+def _batch_job(job):
+    """تشغيل جلسة مسجلة واحدة بإعداد واحد (داخل عملية من المجمع)"""
+    path, params = job
+    replay = SessionReplay(path)
+    try:
+        width, height = replay.world_size or (WIDTH, HEIGHT)
+        smoothing = params.get("smoothing", "median")
+        result = run_headless(replay, width, height, dt=FIXED_DT,
+                              thresholds=sweep_thresholds(params),
+                              smoothing=None if smoothing == "none" else smoothing,
+                              world=load_map(params["map"]) if "map" in params else None,
+                              riders=replay.max_faces)
+    finally:
+        replay.close()
+    result["session"] = path
+    result["completion_time"] = result["sim_time"] if result["completed"] else None
+    result.update(params)
+    return result
+
+def run_batch(sessions, configs=({},), processes=None):
+    """تشغيل كل جلسة مع كل إعداد على مجمع عمليات (افتراضياً بعدد الأنوية)
+    
+    تُرجع النتائج بترتيب (الإعداد، الجلسة)
+    """
+    jobs = [(path, params) for params in configs for path in sessions]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_batch_job, jobs, chunksize=1)
+
+def batch_table(results, configs=({},)):
+    """جدول مجمع لكل إعداد: نسبة الإكمال ومتوسطات الزمن والمسافة والاصطدامات والاكتشاف"""
+    lines = [f"{'config':<32} {'runs':>5} {'done %':>7} {'time s':>7} {'distance':>9} "
+             f"{'collisions':>10} {'detect %':>9}"]
+    for params in configs:
+        rows = [r for r in results if all(r.get(k) == v for k, v in params.items())]
+        if not rows:
+            continue
+        done = [r["completion_time"] for r in rows if r["completed"]]
+        label = ", ".join(f"{k}={v}" for k, v in params.items()) or "defaults"
+        completion = f"{np.mean(done):7.2f}" if done else f"{'-':>7}"
+        lines.append(f"{label:<32} {len(rows):>5} {len(done) / len(rows) * 100:>7.1f} {completion} "
+                     f"{np.mean([r['distance_traveled'] for r in rows]):>9.0f} "
+                     f"{np.mean([r['collisions'] for r in rows]):>10.1f} "
+                     f"{np.mean([r['detection_rate'] for r in rows]):>9.1f}")
+    return "\n".join(lines)
+
+def write_batch_csv(path, results, configs=({},)):
+    """نتيجة كل تشغيل في صف: الجلسة وقيم المعاملات ثم المقاييس"""
+    names = list(dict.fromkeys(name for params in configs for name in params))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["session"] + names + list(BATCH_COLUMNS[1:]),
+                                extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+# ==============================
+# الدالة الرئيسية
+# ==============================
+def main(replay_path=None, record_path=None, show_profiler=False, profile_path=None,
+         user=None, recalibrate=False, map_path=None, camera_urls=None, riders=1):
+    """camera_urls: كاميرا أو أكثر (CAMERA_URL افتراضياً)، و riders: عدد الركاب أمام كل كاميرا"""
+    startup_time = time.perf_counter()
+    # عند إعادة التشغيل تأتي المعالم من التسجيل بدلاً من الكاميرا و Mediapipe
+    replay = SessionReplay(replay_path) if replay_path else None
+    replay_index = 0
+    camera_urls = camera_urls or [CAMERA_URL]
+    # في الإعادة عدد الركاب هو عدد الوجوه في التسجيل
+    total_riders = replay.max_faces if replay is not None else riders * len(camera_urls)
+    # الأنظمة البطيئة تبدأ أولاً وتعمل بالتوازي مع فتح الشاشة: عملية الاستدلال
+    # (قبل فتح الشاشة حتى لا تُنسخ حالة SDL إليها)، أو FaceMesh في خيط خلفي، والكاميرا
+    worker = None
+    face_mesh_loaders = None
+    # ما يُفتح هنا يُغلق في finally حتى لو توقفت الحلقة باستثناء: عملية الاستدلال
+    # وذاكرتها المشتركة، وإطارات التسجيل غير المكتوبة، وملف الأزمنة، والكاميرات
+    recorder = None
+    profiler = None
+    try:
+        if replay is None:
+            if USE_INFERENCE_WORKER:
+                worker = InferenceWorker(CAMERA_FRAME_SHAPE, riders, len(camera_urls)).start()
+            else:
+                face_mesh_loaders = [Deferred(create_face_mesh, riders) for _ in camera_urls]
+            init_camera(camera_urls)
+        init_display()
+        clock = pygame.time.Clock()
+        # عتبات المستخدم المحفوظة، وإلا تبدأ المعايرة قبل القيادة
+        thresholds = load_profile(user) if user and not recalibrate else None
+        calibration = CalibrationSession() if user and thresholds is None else None
+        world = load_map(map_path) if map_path else None
+        # بدون خريطة تُعاد الجلسة في عالم بحجم شاشة التسجيل كما في --headless
+        width, height = (replay.world_size if replay is not None and replay.world_size
+                         else (WIDTH, HEIGHT))
+        try:
+            sim = Simulation(width, height, thresholds=thresholds or GESTURE_THRESHOLDS, world=world,
+                             riders=total_riders)
+        except ValueError as error:
+            # لا مكان لكل الكراسي في العالم (عدد ركاب كبير على شاشة صغيرة مثلاً)
+            raise SystemExit(f"Cannot start: {error}")
+        recorder = SessionRecorder(record_path, max_faces=total_riders,
+                                   world_size=(sim.width, sim.height)) if record_path else None
+        # العالم قد يكون أكبر من الشاشة: منطقة عرض متحركة وخلفية مقطعة تُركب في view
+        viewport = Viewport(WIDTH, HEIGHT, sim.width, sim.height)
+        background = ChunkedBackground(sim.world, (WIDTH, HEIGHT))
+        view = pygame.Surface((WIDTH, HEIGHT)).convert()
+        view_ready = False
+        renderer = DirtyRenderer(screen, view)
+        start_time = time.time()
+        
+        # ساعة الإطارات: لا تشمل فترات الإيقاف، وتُسجل كما هي حتى تعيد الإعادة نفس الخطوات
+        last_frame_time = None
+        paused_time = 0.0
+        pause_started = None
+        first_frame = True
+        stats_texts = None
+        stats_refresh_time = 0
+        profiler = FrameProfiler(export_path=profile_path)
+        
+        # مصدر لكل كاميرا (أو مصدر واحد بصورة بديلة)؛ معايناتها تتقاسم مكان المعاينة
+        # ومخازنها تُحجز مرة واحدة
+        grabbers = cameras if replay is None and CAMERA_AVAILABLE else [None]
+        preview_size = (280 // len(grabbers), 210 // len(grabbers))
+        sources = [CameraSource(grabber, riders, k * riders, preview_size) for k, grabber in enumerate(grabbers)]
+        turn = 0  # المصدر التالي في دور الاستدلال
+        overlay_mode = OVERLAY_MODE
+        blank_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        camera_placeholder = blank_frame.copy()
+        cv2.putText(camera_placeholder, "CAMERA NOT AVAILABLE", (150, 240), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        connecting_placeholder = blank_frame.copy()
+        cv2.putText(connecting_placeholder, "CONNECTING...", (200, 240), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        replay_placeholder = blank_frame.copy()
+        cv2.putText(replay_placeholder, "REPLAY", (250, 240), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        
+        running = True
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        running = False
+                    elif event.key == pygame.K_p:
+                        sim.state = "paused" if sim.state == "running" else "running"
+                    elif event.key == pygame.K_l:
+                        # تبديل طريقة رسم المعالم: off -> sparse -> full
+                        overlay_mode = OVERLAY_MODES[(OVERLAY_MODES.index(overlay_mode) + 1) % len(OVERLAY_MODES)]
+                        for source in sources:
+                            source.preview_dirty = True
+                    elif event.key == pygame.K_F3:
+                        show_profiler = not show_profiler
+                        renderer.invalidate()
+                    elif event.key == pygame.K_r:
+                        sim.reset()
+                        start_time = time.time()
+                        stats_texts = None
+            
+            if sim.state != "running":
+                if pause_started is None:
+                    pause_started = time.perf_counter()
+                # شاشة الإيقاف
+                overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+                overlay.fill((0, 0, 0, 150))
+                screen.blit(overlay, (0, 0))
                 
-                smiling = is_smiling(landmarks)
-                eyebrows_raised = are_eyebrows_raised(landmarks) 
-                eye_dir = get_eye_direction(landmarks)  # الاتجاهات مصححة الآن
-                mouth_open = is_mouth_open(landmarks)
+                pause_text = TEXT_CACHE.render(title_font, "SIMULATION PAUSED", (255, 255, 255))
+                continue_text = TEXT_CACHE.render(font, "Press P to continue or R to reset", (200, 200, 200))
+                screen.blit(pause_text, (WIDTH//2 - pause_text.get_width()//2, HEIGHT//2 - 30))
+                screen.blit(continue_text, (WIDTH//2 - continue_text.get_width()//2, HEIGHT//2 + 20))
+                pygame.display.flip()
+                # عند الاستئناف نحتاج رسم الشاشة كاملة
+                renderer.invalidate()
+                clock.tick(60)
+                continue
                 
-                # تطبيق التحكم بناء على الإيماءات
-                if eyebrows_raised:
-                    wheelchair.move_forward()
-                    action = "EYEBROWS: Forward"
-                    status = "Eyebrows raised"
-                    new_gesture = "forward"
-                    wheelchair.stop_rotation()
-                    
-                elif smiling:
-                    wheelchair.move_backward()
-                    action = "SMILE: Backward" 
-                    status = "Smile detected"
-                    new_gesture = "backward"
-                    wheelchair.stop_rotation()
-                    
-                elif eye_dir == "left":  # تم تصحيح الاتجاه
-                    wheelchair.start_rotation(-1)  # دوران لليسار
-                    action = "LOOK LEFT: Rotate Left"
-                    status = "Looking left"
-                    new_gesture = "rotate_left"
-                    
-                elif eye_dir == "right":  # تم تصحيح الاتجاه
-                    wheelchair.start_rotation(1)   # دوران لليمين
-                    action = "LOOK RIGHT: Rotate Right" 
-                    status = "Looking right"
-                    new_gesture = "rotate_right"
-                    
-                elif mouth_open:
-                    wheelchair.stop_rotation()
-                    action = "MOUTH OPEN: Stop"
-                    status = "Mouth open"
-                    new_gesture = "stop"
-                else:
-                    wheelchair.stop_rotation()
-                    action = "NEUTRAL: No movement"
-                    status = "Face detected"
-                    new_gesture = "neutral"
+            profiler.begin_frame()
+            if pause_started is not None:
+                paused_time += time.perf_counter() - pause_started
+                pause_started = None
+            frame_time = time.perf_counter() - paused_time
+            
+            # قراءة أحدث إطار من كل كاميرا (بدون انتظار)
+            if replay is not None:
+                if replay_index >= len(replay):
+                    print("Replay finished")
+                    break
+                frame_time, replay_keys, faces, slots = replay.frame(replay_index)
+                capture_times = [time.perf_counter()] * len(faces)
+                replay_index += 1
+            new_frames = [source.capture(blank_frame, connecting_placeholder,
+                                         replay_placeholder if replay is not None else camera_placeholder)
+                          for source in sources]
+            profiler.lap("capture")
+            
+            for source, new_frame in zip(sources, new_frames):
+                if new_frame:
+                    source.convert()
+            profiler.lap("color")
+            
+            # تشغيل الاستدلال فقط عند وصول إطار جديد، والجدولة تقرر المنطقة أو التخطي.
+            # الكاميرات تتناوب على استدلال واحد في كل مرة، فتكلفته لا تزيد مع عددها
+            if replay is not None:
+                pass
+            elif USE_INFERENCE_WORKER:
+                largest = max(sources, key=lambda source: source.frame.size).frame
+                if worker is None or largest.size > worker.capacity:
+                    if worker is not None:
+                        worker.close()
+                    worker = InferenceWorker(largest.shape, riders, len(sources)).start()
+                # نستخدم دائماً أحدث نتيجة متاحة دون انتظار العملية
+                if worker.poll():
+                    profiler.add("mesh", worker.mesh_time)
+                    sources[worker.source].observe(worker.faces, worker.roi, worker.timestamp)
+                while not worker.busy:
+                    index = next_source(sources, turn)
+                    if index is None:
+                        break
+                    turn = index + 1
+                    source = sources[index]
+                    run, roi = source.plan()
+                    if run:
+                        worker.submit(source.frame, source.capture_time, roi, index)
+            elif face_mesh_loaders[0].done:
+                while True:
+                    index = next_source(sources, turn)
+                    if index is None:
+                        break
+                    turn = index + 1
+                    source = sources[index]
+                    run, roi = source.plan()
+                    if run:
+                        profiler.lap("inference")
+                        mesh_faces = process_face_mesh(face_mesh_loaders[index].result(), source.frame,
+                                                       roi, max_faces=riders)
+                        profiler.lap("mesh")
+                        source.observe(mesh_faces, roi, source.capture_time)
+                        break
+            if replay is None:
+                faces, slots, capture_times = merge_sources(sources, time.perf_counter())
+            profiler.lap("inference")
+            
+            key_mask = replay_keys if replay is not None else read_key_mask()
+            frame_dt = 0.0 if last_frame_time is None else frame_time - last_frame_time
+            last_frame_time = frame_time
+            if calibration is not None:
+                # أثناء المعايرة تُجمع عينات الراكب الأول فقط والكراسي لا تتحرك
+                fresh = [i for i, slot in enumerate(slots) if slot == 0 and capture_times[i] is not None]
+                calibration.add(frame_dt, faces[fresh] if fresh else None)
+                if calibration.done:
+                    calibrated = calibration.thresholds()
+                    if calibrated is None:
+                        # لا يُحفظ ملف فتُعاد المعايرة في المرة القادمة
+                        print("Calibration: no face during the neutral step, using default thresholds")
+                    else:
+                        sim.set_thresholds(calibrated)
+                        save_profile(user, sim.thresholds)
+                        print(f"Calibration saved to {user_profile_path(user)}")
+                    calibration = None
+                    renderer.invalidate()
+                profiler.lap("gestures")
+                alpha = 1.0
+            else:
+                sim.apply_controls(faces, key_mask, capture_times, frame_dt, slots)
+                profiler.lap("gestures")
+                alpha = sim.advance(frame_dt)
+                if recorder is not None:
+                    recorder.append(frame_time, key_mask, faces, slots)
+            rider = sim.riders[0]
+            wheelchair = rider.wheelchair
+            profiler.lap("update")
+            
+            # تحديث صور المعاينة فقط عند تغير الإطار أو المعالم
+            for source in sources:
+                if source.preview_dirty:
+                    source.preview.update(source.faces if CAMERA_AVAILABLE else (), overlay_mode)
+                    source.preview_dirty = False
+            
+            # تحريك منطقة العرض مع الكراسي (مركزها)؛ عند تحركها تُركب الخلفية من القطع وتُرسم الشاشة كاملة
+            positions = [w.interpolated(alpha) for w in sim.wheelchairs]
+            chair_x = sum(p[0] for p in positions) / len(positions)
+            chair_y = sum(p[1] for p in positions) / len(positions)
+            if viewport.follow(chair_x, chair_y) or not view_ready:
+                background.render(view, viewport.x, viewport.y)
+                renderer.invalidate()
+                view_ready = True
+            offset = viewport.offset
+            
+            # الرسم: الخلفية الثابتة جاهزة، نرسم فوقها العناصر المتحركة فقط
+            renderer.begin()
+            
+            # رسم الأهداف المتبقية لأبطأ راكب (الحالي أولاً)
+            for target in sim.targets[min(r.target_index for r in sim.riders):]:
+                renderer.add(target.draw(screen, offset))
+            
+            # رسم الكراسي
+            for chair in sim.wheelchairs:
+                renderer.add(chair.draw(screen, alpha, offset))
+            
+            # عرض فيديو الكاميرات
+            cam_bg = pygame.Rect(10, 10, 290, 220)
+            pygame.draw.rect(screen, (30, 30, 30), cam_bg)
+            pygame.draw.rect(screen, (100, 100, 100), cam_bg, 2)
+            for k, source in enumerate(sources):
+                screen.blit(source.preview.surface, (15 + k * preview_size[0], 15))
+            renderer.add(cam_bg)
+            profiler.lap("world")
+            
+            # لوحة المعلومات
+            info_bg = pygame.Rect(10, 240, 350, 200)
+            pygame.draw.rect(screen, (0, 0, 0, 180), info_bg)
+            pygame.draw.rect(screen, (100, 100, 100), info_bg, 2)
+            
+            title_text = TEXT_CACHE.render(small_font, "Face Controlled Wheelchair", (255, 255, 255))
+            status_text = TEXT_CACHE.render(small_font, f"Status: {rider.status}", (100, 255, 100))
+            action_text = TEXT_CACHE.render(small_font, f"Action: {rider.action}", (100, 100, 255))
+            gesture_text = TEXT_CACHE.render(small_font, f"Gesture: {rider.current_gesture}", (255, 255, 100))
+            heading = round(wheelchair.direction / HEADING_DISPLAY_STEP) * HEADING_DISPLAY_STEP % 360
+            direction_text = TEXT_CACHE.render(small_font, f"Direction: {heading}°", (200, 200, 255))
+            
+            renderer.add(info_bg)
+            renderer.add([
+                screen.blit(title_text, (20, 250)),
+                screen.blit(status_text, (20, 280)),
+                screen.blit(action_text, (20, 305)),
+                screen.blit(gesture_text, (20, 330)),
+                screen.blit(direction_text, (20, 355))
+            ])
+            
+            # إحصاءات
+            elapsed_time = time.time() - start_time
+            
+            if stats_texts is None or elapsed_time - stats_refresh_time >= HUD_SLOW_REFRESH:
+                stats_refresh_time = elapsed_time
+                stats_texts = (
+                    small_font.render(f"Detection: {sim.detection_rate:.1f}%", True, (200, 200, 200)),
+                    small_font.render(f"Time: {elapsed_time:.1f}s", True, (200, 200, 200)),
+                    small_font.render(f"Distance: {rider.distance_traveled:.0f}px", True, (200, 200, 200))
+                )
+            stats_text, time_text, distance_text = stats_texts
+            
+            renderer.add([
+                screen.blit(stats_text, (20, 385)),
+                screen.blit(time_text, (20, 410)),
+                screen.blit(distance_text, (20, 435))
+            ])
+            if len(sim.targets) > 1:
+                targets_text = TEXT_CACHE.render(small_font, f"Targets: {rider.target_index}/{len(sim.targets)}",
+                                                 (255, 150, 150))
+                renderer.add(screen.blit(targets_text, (200, 410)))
+            
+            # سطر لكل راكب بلون كرسيه
+            if len(sim.riders) > 1:
+                riders_bg = pygame.Rect(10, 460, 350, 10 + 22 * len(sim.riders))
+                pygame.draw.rect(screen, (0, 0, 0), riders_bg)
+                pygame.draw.rect(screen, (100, 100, 100), riders_bg, 2)
+                renderer.add(riders_bg)
+                for i, other in enumerate(sim.riders):
+                    line = TEXT_CACHE.render(small_font, f"Rider {i + 1}: {other.current_gesture}  "
+                                             f"targets {other.target_index}/{len(sim.targets)}",
+                                             other.wheelchair.color)
+                    renderer.add(screen.blit(line, (20, 467 + 22 * i)))
+            
+            if calibration is not None:
+                renderer.add(calibration.draw(screen, WIDTH // 2 - 260, 20))
+            
+            # لوحة أزمنة المراحل (F3)
+            if show_profiler:
+                renderer.add(profiler.draw(screen, WIDTH - 310, 10))
+            
+            # رسالة النجاح
+            if sim.state == "completed":
+                overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+                overlay.fill((0, 50, 0, 150))
+                screen.blit(overlay, (0, 0))
                 
-                # تحديث الإيماءة الحالية
-                current_gesture = new_gesture
+                success_text = TEXT_CACHE.render(title_font, "MISSION COMPLETED!", (100, 255, 100))
+                time_taken = small_font.render(f"Time: {elapsed_time:.1f}s - Distance: {rider.distance_traveled:.0f}px", 
+                                             True, (200, 255, 200))
+                restart_text = TEXT_CACHE.render(small_font, "Press R to restart", (200, 200, 100))
                 
-                if CAMERA_AVAILABLE:
-                    h, w, _ = frame.shape
-                    for landmark in landmarks:
-                        x = int(landmark.x * w)
-                        y = int(landmark.y * h)
-                        cv2.circle(frame, (x, y), 1, (0, 255, 0), -1)
-        
-        # إذا لم يكن هناك اكتشاف للوجه، توقف عن الدوران
-        if not results.multi_face_landmarks:
-            wheelchair.stop_rotation()
-            current_gesture = "neutral"
-        
-        wheelchair.update()
-        target.update()
-        
-        # حساب المسافة المقطوعة
-        distance_traveled += math.sqrt((wheelchair.x - last_x)**2 + (wheelchair.y - last_y)**2)
-        last_x, last_y = wheelchair.x, wheelchair.y
-        
-        # التحقق من الوصول إلى الهدف
-        target_distance = math.sqrt((wheelchair.x - target.x)**2 + (wheelchair.y - target.y)**2)
-        if target_distance < wheelchair.width//2 + target.radius:
-            simulation_state = "completed"
-        
-        # الرسم
-        screen.fill((60, 60, 80))
-        
-        # شبكة أرضية
-        for x in range(0, WIDTH, 80):
-            pygame.draw.line(screen, (100, 100, 100, 50), (x, 0), (x, HEIGHT), 1)
-        for y in range(0, HEIGHT, 80):
-            pygame.draw.line(screen, (100, 100, 100, 50), (0, y), (WIDTH, y), 1)
-        
-        # رسم العقبات
-        for obstacle in obstacles:
-            obstacle.draw(screen)
-        
-        # رسم الهدف
-        target.draw(screen)
-        
-        # رسم الكرسي
-        wheelchair.draw(screen)
-        
-        # تحويل وعرض فيديو الكاميرا
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_surface = pygame.surfarray.make_surface(frame_rgb.swapaxes(0, 1))
-        frame_surface = pygame.transform.scale(frame_surface, (280, 210))
-        
-        cam_bg = pygame.Rect(10, 10, 290, 220)
-        pygame.draw.rect(screen, (30, 30, 30), cam_bg)
-        pygame.draw.rect(screen, (100, 100, 100), cam_bg, 2)
-        screen.blit(frame_surface, (15, 15))
-        
-        # لوحة المعلومات
-        info_bg = pygame.Rect(10, 240, 350, 200)
-        pygame.draw.rect(screen, (0, 0, 0, 180), info_bg)
-        pygame.draw.rect(screen, (100, 100, 100), info_bg, 2)
-        
-        title_text = small_font.render("Face Controlled Wheelchair", True, (255, 255, 255))
-        status_text = small_font.render(f"Status: {status}", True, (100, 255, 100))
-        action_text = small_font.render(f"Action: {action}", True, (100, 100, 255))
-        gesture_text = small_font.render(f"Gesture: {current_gesture}", True, (255, 255, 100))
-        direction_text = small_font.render(f"Direction: {int(wheelchair.direction)}°", True, (200, 200, 255))
-        
-        screen.blit(title_text, (20, 250))
-        screen.blit(status_text, (20, 280))
-        screen.blit(action_text, (20, 305))
-        screen.blit(gesture_text, (20, 330))
-        screen.blit(direction_text, (20, 355))
+                screen.blit(success_text, (WIDTH//2 - success_text.get_width()//2, HEIGHT//2 - 40))
+                screen.blit(time_taken, (WIDTH//2 - time_taken.get_width()//2, HEIGHT//2))
+                screen.blit(restart_text, (WIDTH//2 - restart_text.get_width()//2, HEIGHT//2 + 40))
+                renderer.invalidate()
+            profiler.lap("hud")
+            
+            renderer.present()
+            profiler.lap("flip")
+            if first_frame:
+                first_frame = False
+                print(f"First interactive frame {(time.perf_counter() - startup_time) * 1000:.0f} ms after main()")
+            for k, source in enumerate(sources):
+                if source.grabber is not None:
+                    profiler.counters[f"camera {k + 1} frames"] = source.grabber.frame_index
+                    profiler.counters[f"camera {k + 1} dropped"] = source.grabber.dropped_frames
+            profiler.end_frame()
+            clock.tick(60)
         
-        # إحصاءات
-        elapsed_time = time.time() - start_time
-        detection_rate = (detection_count / frame_count * 100) if frame_count > 0 else 0
-        
-        stats_text = small_font.render(f"Detection: {detection_rate:.1f}%", True, (200, 200, 200))
-        time_text = small_font.render(f"Time: {elapsed_time:.1f}s", True, (200, 200, 200))
-        distance_text = small_font.render(f"Distance: {distance_traveled:.0f}px", True, (200, 200, 200))
-        
-        screen.blit(stats_text, (20, 385))
-        screen.blit(time_text, (20, 410))
-        screen.blit(distance_text, (20, 435))
-        
-        # رسالة النجاح
-        if simulation_state == "completed":
-            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 50, 0, 150))
-            screen.blit(overlay, (0, 0))
-            
-            success_text = title_font.render("MISSION COMPLETED!", True, (100, 255, 100))
-            time_taken = small_font.render(f"Time: {elapsed_time:.1f}s - Distance: {distance_traveled:.0f}px", 
-                                         True, (200, 255, 200))
-            restart_text = small_font.render("Press R to restart", True, (200, 200, 100))
-            
-            screen.blit(success_text, (WIDTH//2 - success_text.get_width()//2, HEIGHT//2 - 40))
-            screen.blit(time_taken, (WIDTH//2 - time_taken.get_width()//2, HEIGHT//2))
-            screen.blit(restart_text, (WIDTH//2 - restart_text.get_width()//2, HEIGHT//2 + 40))
-        
-        pygame.display.flip()
-        clock.tick(60)
-    
-    if CAMERA_AVAILABLE:
-        cap.release()
-    pygame.quit()
+        if sim.latency.histograms:
+            print("Gesture-to-motion latency:")
+            print(sim.latency.report())
+        for k, source in enumerate(sources):
+            if source.scheduler is not None:
+                print("Inference schedule:" if len(sources) == 1 else f"Inference schedule (camera {k + 1}):",
+                      source.scheduler.counts)
+            if source.grabber is not None and source.grabber.frame_index:
+                print(f"Camera {k + 1}: {source.grabber.frame_index} frames captured, "
+                      f"{source.grabber.dropped_frames} dropped")
+    finally:
+        if worker is not None:
+            worker.close()
+        if recorder is not None:
+            recorder.close()
+        if profiler is not None:
+            profiler.export()
+        for grabber in cameras:
+            grabber.release()
+        pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Face-Controlled Wheelchair Simulation")
+    parser.add_argument("--headless", action="store_true",
+                        help="run scripted sessions without a display or camera")
+    parser.add_argument("--runs", type=int, default=1000,
+                        help="number of headless sessions to run")
+    parser.add_argument("--dt", type=float, default=HEADLESS_DT,
+                        help="physics step in seconds for headless scripted runs")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record landmarks, timestamps and keys to a session file")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="replay a recorded session instead of the camera")
+    parser.add_argument("--perf", action="store_true",
+                        help="show the per-stage frame time panel (toggle with F3)")
+    parser.add_argument("--perf-out", metavar="PATH",
+                        help="export stage timings at exit (.json summary or .csv per frame)")
+    parser.add_argument("--user", metavar="NAME",
+                        help="load this rider's gesture thresholds (calibrates first if none saved)")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="recalibrate the --user profile even if one is saved")
+    parser.add_argument("--map", metavar="PATH",
+                        help="JSON world map (size, start, targets, obstacles) instead of the default room")
+    parser.add_argument("--camera", action="append", metavar="URL",
+                        help="camera source (repeat for one camera per rider group; default: CAMERA_URL)")
+    parser.add_argument("--riders", type=int, default=1,
+                        help="riders in front of each camera, each driving their own chair "
+                             "(faces are seated left to right)")
+    parser.add_argument("--batch", nargs="+", metavar="PATH",
+                        help="replay these recorded sessions headless on a process pool")
+    parser.add_argument("--sweep", action="append", default=[], metavar="NAME=V1,V2",
+                        help=f"batch parameter values to try (repeatable); NAME is one of "
+                             f"{', '.join(SWEEP_PARAMETERS)}")
+    parser.add_argument("--jobs", type=int, help="batch worker processes (default: all cores)")
+    parser.add_argument("--batch-out", metavar="PATH", help="write per-run batch results as CSV")
+    args = parser.parse_args()
+    if args.calibrate and not args.user:
+        parser.error("--calibrate needs --user NAME")
+    if not 1 <= args.riders * len(args.camera or [None]) <= 255:
+        parser.error("--riders must be at least 1 (and at most 255 riders in total)")
+    
+    if args.batch:
+        try:
+            configs = parse_sweep(args.sweep)
+        except ValueError as error:
+            parser.error(str(error))
+        start = time.perf_counter()
+        results = run_batch(args.batch, configs, args.jobs)
+        print(batch_table(results, configs))
+        print(f"{len(results)} runs in {time.perf_counter() - start:.2f}s")
+        if args.batch_out:
+            write_batch_csv(args.batch_out, results, configs)
+    elif args.headless and args.replay:
+        # نفس خطوة الفيزياء وحدود العالم كالجلسة الحية حتى تتطابق النتائج
+        replay = SessionReplay(args.replay)
+        width, height = replay.world_size or (WIDTH, HEIGHT)
+        thresholds = (load_profile(args.user) if args.user else None) or GESTURE_THRESHOLDS
+        print(run_headless(replay, width, height, stop_on_complete=False, dt=FIXED_DT,
+                           thresholds=thresholds,
+                           world=load_map(args.map) if args.map else None,
+                           riders=replay.max_faces))
+    elif args.headless:
+        headless_demo(args.runs, args.dt)
+    else:
+        main(replay_path=args.replay, record_path=args.record,
+             show_profiler=args.perf, profile_path=args.perf_out,
+             user=args.user, recalibrate=args.calibrate, map_path=args.map,
+             camera_urls=args.camera, riders=args.riders)
 